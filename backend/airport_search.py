@@ -0,0 +1,216 @@
+import re
+from array import array
+from bisect import bisect_left
+from heapq import nsmallest
+from typing import Dict, List
+
+import numpy as np
+
+# Prefix index for airport typeahead. Every searchable key (ident, ICAO, GPS and
+# local codes, plus each token of the airport name) is stored once in a sorted
+# list; a query is a bisect to the first key >= prefix followed by a short scan.
+# Airport records are kept as compact tuples and referenced by integer id so the
+# whole index stays a few MB for the full OurAirports dataset. Multi-word
+# queries intersect the airport-id sets of each word's prefix range, smallest
+# first; sets for short, common prefixes are precomputed.
+
+CODE_FIELDS = ['ident', 'icao_code', 'gps_code', 'local_code']
+
+# Lower rank sorts first: big public airports before strips, heliports and closed fields
+TYPE_RANK = {
+    'large_airport': 0,
+    'medium_airport': 1,
+    'small_airport': 2,
+    'seaplane_base': 3,
+    'heliport': 4,
+    'balloonport': 5,
+    'closed': 6,
+}
+DEFAULT_TYPE_RANK = 5
+
+KIND_CODE = 0
+KIND_NAME = 1
+
+MAX_LIMIT = 50
+# Prefixes matching more keys than this get their airport-id set (and, up to
+# PRECOMPUTE_MAX_PREFIX characters, their top results) precomputed at build
+# time, so common words and one- or two-letter queries never scan tens of
+# thousands of keys
+PRECOMPUTE_THRESHOLD = 512
+PRECOMPUTE_MAX_PREFIX = 3
+# Below this many candidates the remaining words are checked per airport
+# against its stored words instead of intersecting id sets
+WORD_CHECK_MAX = 64
+
+_TOKEN_RE = re.compile(r'[A-Z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(str(text or '').upper())
+
+
+class AirportSearchIndex:
+    def __init__(self, rows):
+        # (code, name, type, municipality, country, lat, lon) per airport
+        self.airports = []
+        self.ranks = array('B')
+        self.words = []  # searchable words (codes and name tokens) per airport
+        entries = []
+        for row in rows:
+            codes = []
+            for field in CODE_FIELDS:
+                code = str(row.get(field) or '').strip().upper()
+                if code and code not in codes:
+                    codes.append(code)
+            if not codes:
+                continue
+            try:
+                lat = round(float(row.get('latitude_deg')), 4)
+                lon = round(float(row.get('longitude_deg')), 4)
+            except (TypeError, ValueError):
+                continue
+            airport_id = len(self.airports)
+            name = row.get('name') or codes[0]
+            atype = row.get('type') or ''
+            self.airports.append((
+                str(row.get('icao_code') or '').upper() or codes[0],
+                name,
+                atype,
+                row.get('municipality') or '',
+                row.get('iso_country') or '',
+                lat,
+                lon,
+            ))
+            self.ranks.append(TYPE_RANK.get(atype, DEFAULT_TYPE_RANK))
+            tokens = [t for t in dict.fromkeys(tokenize(name)) if t not in codes]
+            self.words.append(tuple(codes + tokens))
+            for code in codes:
+                entries.append((code, KIND_CODE, airport_id))
+            for token in tokens:
+                entries.append((token, KIND_NAME, airport_id))
+        entries.sort()
+        self.keys = [e[0] for e in entries]
+        self.kinds = array('B', (e[1] for e in entries))
+        self.ids = array('I', (e[2] for e in entries))
+        self.ids_np = np.frombuffer(self.ids, dtype=np.uint32) if len(self.ids) else np.empty(0, dtype=np.uint32)
+        self.ranks_np = np.frombuffer(self.ranks, dtype=np.uint8) if len(self.ranks) else np.empty(0, dtype=np.uint8)
+        self.members: Dict[str, np.ndarray] = {}
+        self.top = self._precompute_top()
+
+    def __len__(self):
+        return len(self.airports)
+
+    def _score(self, i: int, query: str):
+        airport_id = self.ids[i]
+        exact = 0 if (self.kinds[i] == KIND_CODE and self.keys[i] == query) else 1
+        return (exact, self.ranks[airport_id], self.kinds[i], len(self.keys[i]), airport_id)
+
+    def _rank_range(self, lo: int, hi: int, query: str, limit: int) -> List[int]:
+        best: Dict[int, tuple] = {}
+        for i in range(lo, hi):
+            airport_id = self.ids[i]
+            score = self._score(i, query)
+            prev = best.get(airport_id)
+            if prev is None or score < prev:
+                best[airport_id] = score
+        return [s[-1] for s in nsmallest(limit, best.values())]
+
+    def _prefix_range(self, prefix: str):
+        lo = bisect_left(self.keys, prefix)
+        # Every key starting with prefix sorts below prefix + U+FFFF
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        return lo, hi
+
+    def _common_prefixes(self) -> set:
+        # Every prefix (any length) matching more than PRECOMPUTE_THRESHOLD keys.
+        # Such a prefix is shared by some key and the key THRESHOLD places later.
+        longest = set()
+        keys, step = self.keys, PRECOMPUTE_THRESHOLD
+        for i in range(len(keys) - step):
+            a, b = keys[i], keys[i + step]
+            n = 0
+            while n < len(a) and n < len(b) and a[n] == b[n]:
+                n += 1
+            if n:
+                longest.add(a[:n])
+        return {p[:n] for p in longest for n in range(1, len(p) + 1)}
+
+    def _precompute_top(self) -> Dict[str, array]:
+        top = {}
+        for prefix in self._common_prefixes():
+            lo, hi = self._prefix_range(prefix)
+            self.members[prefix] = np.unique(self.ids_np[lo:hi])
+            if len(prefix) <= PRECOMPUTE_MAX_PREFIX:
+                top[prefix] = array('I', self._rank_range(lo, hi, prefix, MAX_LIMIT))
+        return top
+
+    def _matching_ids(self, prefix: str) -> np.ndarray:
+        # Sorted ids of airports with a word starting with prefix
+        found = self.members.get(prefix)
+        if found is None:
+            lo, hi = self._prefix_range(prefix)
+            found = np.unique(self.ids_np[lo:hi])
+        return found
+
+    def _matches_all(self, airport_id: int, tokens: List[str]) -> bool:
+        words = self.words[airport_id]
+        return all(any(w.startswith(t) for w in words) for t in tokens)
+
+    def _search_words(self, tokens: List[str], limit: int) -> List[int]:
+        # Airports matching every token, best type first. Start from the
+        # narrowest prefix range and narrow further with each next one.
+        sizes = {}
+        for t in tokens:
+            lo, hi = self._prefix_range(t)
+            sizes[t] = hi - lo
+        by_size = sorted(tokens, key=sizes.get)
+        ids = self._matching_ids(by_size[0])
+        for i, token in enumerate(by_size[1:], 1):
+            if len(ids) <= WORD_CHECK_MAX:
+                rest = by_size[i:]
+                ids = np.array([a for a in ids.tolist() if self._matches_all(a, rest)], dtype=np.uint32)
+                break
+            ids = ids[np.isin(ids, self._matching_ids(token), assume_unique=True)]
+            if not len(ids):
+                break
+        order = np.argsort(self.ranks_np[ids], kind='stable')[:limit]
+        return ids[order].tolist()
+
+    def search(self, query: str, limit: int = 10) -> List[tuple]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+        tokens = list(dict.fromkeys(tokens))
+        lead = tokens[0]
+        if len(tokens) > 1:
+            ids = self._search_words(tokens, limit)
+        elif lead in self.top:
+            ids = self.top[lead][:limit]
+        elif lead in self.members:
+            # Common long word: rank the precomputed set, exact code matches first
+            lo, _ = self._prefix_range(lead)
+            exact = []
+            # Entries sort by (key, kind), so exact codes lead the range
+            while lo < len(self.keys) and self.keys[lo] == lead and self.kinds[lo] == KIND_CODE:
+                if self.ids[lo] not in exact:
+                    exact.append(self.ids[lo])
+                lo += 1
+            ids = (exact + [a for a in self._search_words(tokens, limit + len(exact)) if a not in exact])[:limit]
+        else:
+            lo, hi = self._prefix_range(lead)
+            ids = self._rank_range(lo, hi, lead, limit)
+        return [self.airports[a] for a in ids]
+
+
+def compact_result(airport: tuple) -> Dict:
+    code, name, atype, municipality, country, lat, lon = airport
+    return {
+        'icao': code,
+        'name': name,
+        'type': atype,
+        'city': municipality,
+        'country': country,
+        'lat': lat,
+        'lon': lon,
+    }
@@ -0,0 +1,189 @@
+import re
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, Point
+
+# Altitude-aware airspace lookup: a 2D STRtree over the airspace polygons plus
+# per-airspace numeric floor/ceiling (feet MSL) parsed from OpenAIP
+# lowerLimit/upperLimit. A query takes a segment and an altitude band and only
+# returns airspaces that overlap both.
+#
+# AGL limits are converted without terrain data: floors as if the ground were
+# at sea level, ceilings over a per-airspace ground estimate from the airports
+# in or near it (ground_estimates_ft). Floors are never higher than the real
+# floor; ceilings are only as good as the nearby field elevations.
+
+M_TO_FT = 3.28084
+# Ceiling used for UNL/missing upper limits; finite so it survives JSON encoding
+UNLIMITED_FT = 99999.0
+# Highest terrain in the US (Denali): ground assumed under an AGL ceiling with
+# no airport anywhere near it
+MAX_TERRAIN_FT = 20310.0
+# How far from an airspace with no airport inside it to look for one
+GROUND_SEARCH_NM = 25.0
+NM_PER_DEG_LAT = 60.0
+
+# OpenAIP limit units
+UNIT_METER = 0
+UNIT_FEET = 1
+UNIT_FLIGHT_LEVEL = 6
+# OpenAIP reference datums
+DATUM_GND = 0
+
+# OpenAIP ICAO classes E, F and G need no clearance for VFR flight
+VFR_TRANSPARENT_CLASSES = {4, 5, 6}
+# Restricted, danger, prohibited and TFR areas are always obstacles, whatever their class
+SPECIAL_USE_TYPES = {1, 2, 3, 31}
+# FIR/UIR boundaries cover whole countries and are never avoided
+VFR_TRANSPARENT_TYPES = {10, 11}
+
+VERTICAL_BUFFER_FT = 500
+
+_FT_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*(FT|F|M)?\s*(AGL|AMSL|MSL|GND|SFC)?$')
+
+Band = Tuple[float, float]
+
+
+def parse_limit_ft(limit, default: float, ground_ft: float = 0.0) -> float:
+    # OpenAIP limit ({value, unit, referenceDatum}), legacy string or number ->
+    # feet MSL. Heights above ground are taken over ground at ground_ft: 0 for
+    # floors, the airspace's ground estimate for ceilings.
+    if limit is None:
+        return default
+    if isinstance(limit, dict):
+        try:
+            value = float(limit.get('value', 0))
+        except (TypeError, ValueError):
+            return default
+        unit = limit.get('unit', UNIT_FEET)
+        if unit == UNIT_FLIGHT_LEVEL:
+            return value * 100
+        if unit == UNIT_METER:
+            value *= M_TO_FT
+        if limit.get('referenceDatum') == DATUM_GND:
+            value += ground_ft
+        return value
+    if isinstance(limit, (int, float)):
+        return float(limit)
+    text = str(limit).strip().upper()
+    if text in ('GND', 'SFC', 'SURFACE'):
+        return ground_ft
+    if text.startswith('UNL'):
+        return UNLIMITED_FT
+    if text.startswith('FL'):
+        try:
+            return float(text[2:].strip()) * 100
+        except ValueError:
+            return default
+    m = _FT_RE.match(text)
+    if not m:
+        return default
+    value = float(m.group(1))
+    if m.group(2) == 'M':
+        value *= M_TO_FT
+    if m.group(3) in ('AGL', 'GND', 'SFC'):
+        value += ground_ft
+    return value
+
+
+def ground_estimates_ft(geometries: Sequence, lats: Sequence[float], lons: Sequence[float],
+                        elevations_ft: Sequence[float], search_nm: float = GROUND_SEARCH_NM,
+                        fallback_ft: float = MAX_TERRAIN_FT) -> np.ndarray:
+    # Ground elevation to put under each airspace's AGL ceiling: the highest
+    # airport inside it, else the highest within search_nm of it, else fallback_ft
+    geoms = np.array(list(geometries), dtype=object)
+    ground = np.full(len(geoms), -np.inf)
+    elevations = np.asarray(elevations_ft, dtype=float)
+    if len(geoms) and len(elevations):
+        tree = shapely.STRtree(shapely.points(lons, lats))
+        g, p = tree.query(geoms, predicate='intersects')
+        np.maximum.at(ground, g, elevations[p])
+        missing = np.flatnonzero(np.isinf(ground))
+        if len(missing):
+            # Degrees of longitude shrink with latitude; widen so nothing is missed
+            lat = np.abs(shapely.bounds(geoms[missing])[:, [1, 3]]).max(axis=1)
+            deg = search_nm / NM_PER_DEG_LAT / np.maximum(np.cos(np.radians(np.minimum(lat, 89.0))), 0.05)
+            g, p = tree.query(geoms[missing], predicate='dwithin', distance=deg)
+            np.maximum.at(ground, missing[g], elevations[p])
+    ground[np.isinf(ground)] = fallback_ft
+    return np.maximum(ground, 0.0)
+
+
+def is_vfr_transparent(icao_class, asp_type) -> bool:
+    if asp_type in VFR_TRANSPARENT_TYPES:
+        return True
+    return icao_class in VFR_TRANSPARENT_CLASSES and asp_type not in SPECIAL_USE_TYPES
+
+
+def cruise_band(altitude_ft: float, buffer_ft: float = VERTICAL_BUFFER_FT) -> Band:
+    return (altitude_ft - buffer_ft, altitude_ft + buffer_ft)
+
+
+class AirspaceIndex:
+    def __init__(self, geometries: Sequence, floors_ft: Sequence[float], ceilings_ft: Sequence[float],
+                 transparent: Optional[Sequence[bool]] = None):
+        self.geometries = np.array(list(geometries), dtype=object)
+        self.floors = np.asarray(floors_ft, dtype=float)
+        self.ceilings = np.asarray(ceilings_ft, dtype=float)
+        if transparent is None:
+            transparent = np.zeros(len(self.geometries), dtype=bool)
+        self.obstacle = ~np.asarray(transparent, dtype=bool)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    @classmethod
+    def from_features(cls, features: Iterable[dict]) -> 'AirspaceIndex':
+        features = list(features)
+        return cls(
+            [f['geometry'] for f in features],
+            [f.get('lower_ft', 0.0) for f in features],
+            [f.get('upper_ft', UNLIMITED_FT) for f in features],
+            [is_vfr_transparent(f.get('icao_class'), f.get('type')) for f in features],
+        )
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def band_mask(self, band: Band) -> np.ndarray:
+        # Airspaces that must be avoided anywhere in [band[0], band[1]]
+        lo, hi = band
+        return self.obstacle & (self.floors < hi) & (self.ceilings > lo)
+
+    def containing(self, lat: float, lon: float) -> np.ndarray:
+        return self.tree.query(Point(lon, lat), predicate='intersects')
+
+    def containing_any(self, points: Iterable[Tuple[float, float]]) -> set:
+        # Airspaces around any of the (lat, lon) points, e.g. a leg's departure and arrival fields
+        found = set()
+        for lat, lon in points:
+            found.update(self.containing(lat, lon).tolist())
+        return found
+
+    def _lateral(self, lat1, lon1, lat2, lon2, exempt) -> np.ndarray:
+        hits = self.tree.query(LineString([(lon1, lat1), (lon2, lat2)]), predicate='intersects')
+        hits = hits[self.obstacle[hits]]
+        if exempt is not None:
+            hits = hits[~np.isin(hits, np.fromiter(exempt, dtype=np.int64))]
+        return hits
+
+    def conflicts(self, lat1: float, lon1: float, lat2: float, lon2: float, band: Band,
+                  exempt: Optional[Iterable[int]] = None) -> np.ndarray:
+        # Indices of airspaces the segment crosses laterally within the altitude band
+        hits = self._lateral(lat1, lon1, lat2, lon2, exempt)
+        lo, hi = band
+        return hits[(self.floors[hits] < hi) & (self.ceilings[hits] > lo)]
+
+    def lowest_clear_altitude(self, lat1: float, lon1: float, lat2: float, lon2: float, start_ft: float,
+                              step_ft: float, max_ft: float, exempt: Optional[Iterable[int]] = None) -> Optional[float]:
+        # Lowest altitude >= start_ft (in step_ft increments) at which the leg crosses no airspace
+        hits = self._lateral(lat1, lon1, lat2, lon2, exempt)
+        floors, ceilings = self.floors[hits], self.ceilings[hits]
+        alt = start_ft
+        while alt <= max_ft:
+            lo, hi = cruise_band(alt)
+            if not np.any((floors < hi) & (ceilings > lo)):
+                return alt
+            alt += step_ft
+        return None
@@ -0,0 +1,129 @@
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, Point
+
+# Corridor queries: every indexed airport within a given distance of a route
+# polyline, ordered by how far along the route it lies.
+#
+# Airports are held as points in an STRtree. A query first pulls candidates
+# with a single `dwithin` lookup around the whole polyline (in degrees, widened
+# so it never misses at the route's highest latitude), then computes exact
+# great-circle cross-track and along-track distances for all candidates
+# against all legs at once with unit-vector math.
+
+EARTH_RADIUS_NM = 3440.065
+NM_PER_DEG_LAT = 60.0
+FT_PER_NM = 6076.12
+DEFAULT_GLIDE_RATIO = 9.0
+
+LatLon = Tuple[float, float]
+
+
+def glide_radius_nm(altitude_ft: float, glide_ratio: float = DEFAULT_GLIDE_RATIO) -> float:
+    # Still-air gliding distance from altitude_ft (treated as height above the ground)
+    return max(0.0, altitude_ft) * glide_ratio / FT_PER_NM
+
+
+def _unit_vectors(lats, lons) -> np.ndarray:
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class CorridorIndex:
+    def __init__(self, codes: Sequence[str], names: Sequence[str], lats: Sequence[float], lons: Sequence[float],
+                 fuel: Optional[Sequence[bool]] = None):
+        self.codes = list(codes)
+        self.names = list(names)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.fuel = np.asarray(fuel if fuel is not None else np.zeros(len(self.codes)), dtype=bool)
+        self.vectors = _unit_vectors(self.lats, self.lons)
+        self.tree = shapely.STRtree(shapely.points(self.lons, self.lats))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _candidates(self, geom, radius_nm: float, max_lat: float) -> np.ndarray:
+        deg = radius_nm / NM_PER_DEG_LAT / max(math.cos(math.radians(min(abs(max_lat), 89.0))), 0.05)
+        return self.tree.query(geom, predicate='dwithin', distance=deg)
+
+    def query(self, polyline: Sequence[LatLon], radius_nm: float, exclude: Iterable[str] = (),
+              fuel_only: bool = False) -> List[Dict]:
+        # Airports within radius_nm of the polyline [(lat, lon), ...], ordered by
+        # along-track distance. cross_track_nm is positive right of the route.
+        if len(polyline) < 2 or not len(self):
+            return []
+        pts = np.asarray(polyline, dtype=float)
+        cand = self._candidates(LineString(pts[:, ::-1]), radius_nm, float(np.abs(pts[:, 0]).max()) + radius_nm / NM_PER_DEG_LAT)
+        if fuel_only:
+            cand = cand[self.fuel[cand]]
+        if not len(cand):
+            return []
+        a = _unit_vectors(pts[:-1, 0], pts[:-1, 1])  # (S, 3) leg starts
+        b = _unit_vectors(pts[1:, 0], pts[1:, 1])    # (S, 3) leg ends
+        leg_len = np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1.0, 1.0))
+        normal = np.cross(a, b)
+        norm = np.linalg.norm(normal, axis=1)
+        normal = normal / np.where(norm > 0, norm, 1.0)[:, None]
+        p = self.vectors[cand]  # (C, 3)
+        # Signed angular offset from each leg's great circle, (C, S)
+        sin_xt = np.clip(p @ normal.T, -1.0, 1.0)
+        xt = np.arcsin(sin_xt)
+        # Angle along each leg from its start to the point's projection
+        proj = p[:, None, :] - sin_xt[..., None] * normal[None, :, :]
+        along = np.arctan2(np.einsum('ijk,jk->ij', np.cross(a[None, :, :], proj), normal),
+                           np.einsum('ijk,jk->ij', proj, a))
+        inside = (along >= 0) & (along <= leg_len[None, :])
+        to_a = np.arccos(np.clip(p @ a.T, -1.0, 1.0))
+        to_b = np.arccos(np.clip(p @ b.T, -1.0, 1.0))
+        dist = np.where(inside, np.abs(xt), np.minimum(to_a, to_b))
+        along = np.clip(along, 0, leg_len[None, :])
+        # Degenerate (zero-length) legs only count through their endpoints
+        dist = np.where(norm[None, :] > 0, dist, to_a)
+        leg = np.argmin(dist, axis=1)
+        rows = np.arange(len(cand))
+        best = dist[rows, leg] * EARTH_RADIUS_NM
+        offsets = np.concatenate([[0.0], np.cumsum(leg_len)[:-1]])
+        along_nm = (offsets[leg] + along[rows, leg]) * EARTH_RADIUS_NM
+        # Right of the direction of travel is a negative dot with the left-hand normal
+        cross_nm = -xt[rows, leg] * EARTH_RADIUS_NM
+        excluded = set(c.upper() for c in exclude)
+        results = []
+        for k in np.argsort(along_nm, kind='stable'):
+            if best[k] > radius_nm:
+                continue
+            i = cand[k]
+            if self.codes[i] in excluded:
+                continue
+            results.append({
+                'icao': self.codes[i],
+                'name': self.names[i],
+                'lat': float(self.lats[i]),
+                'lon': float(self.lons[i]),
+                'along_track_nm': round(float(along_nm[k]), 1),
+                'cross_track_nm': round(float(cross_nm[k]), 1),
+                'fuel': bool(self.fuel[i]),
+            })
+        return results
+
+    def nearest(self, lat: float, lon: float, exclude: Iterable[str] = (), fuel_only: bool = False,
+                max_radius_nm: float = 500.0) -> Optional[Dict]:
+        # Closest airport to a point, widening the search radius until one qualifies
+        radius = 25.0
+        excluded = set(c.upper() for c in exclude)
+        target = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        while radius <= max_radius_nm:
+            cand = self._candidates(Point(lon, lat), radius, abs(lat) + radius / NM_PER_DEG_LAT)
+            cand = [i for i in cand if self.codes[i] not in excluded and (self.fuel[i] or not fuel_only)]
+            if cand:
+                dists = np.arccos(np.clip(self.vectors[cand] @ target, -1.0, 1.0)) * EARTH_RADIUS_NM
+                k = int(np.argmin(dists))
+                if dists[k] <= radius:
+                    i = cand[k]
+                    return {'icao': self.codes[i], 'name': self.names[i], 'lat': float(self.lats[i]),
+                            'lon': float(self.lons[i]), 'distance_nm': round(float(dists[k]), 1)}
+            radius *= 2
+        return None
@@ -0,0 +1,249 @@
+import math
+from heapq import heappush, heappop
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+import shapely.geometry.polygon
+from shapely.geometry import LineString, Point
+
+# Airspace detour planning on a local visibility graph.
+#
+# Obstacle polygons are prepared once at load time: each is buffered by the
+# requested clearance, simplified, and indexed in an STRtree. A leg that
+# crosses an obstacle is re-planned with A* over the start, the end and the
+# convex outline vertices of the obstacles in play; an edge is usable when it
+# does not cross any obstacle's inner "keep-out" polygon (half the clearance),
+# so paths that hug the buffered outline stay legal.
+#
+# Only obstacles that actually get in the way contribute vertices: the search
+# starts with those crossing the direct leg and, if it cannot get through,
+# adds the ones that blocked its edges and tries again. Overlapping obstacles
+# are merged, so only the convex corners of their combined outline are
+# vertices, and an edge out of a node is only considered when it meets its far
+# vertex on a tangent. Edges are screened against the merged in-play keep-out
+# area in one prepared test, and the survivors are checked against every
+# obstacle in one bulk tree query. Merging can close a gap that is still open
+# between keep-out areas, so a search that runs out of options gets one last
+# round over every obstacle's own corners. The work per leg is capped.
+
+NM_PER_DEG_LAT = 60.0
+DEFAULT_BUFFER_NM = 2.0
+DEFAULT_SIMPLIFY_NM = 0.5
+# Work caps per leg: rounds of adding blocking obstacles, candidate vertices
+# per round and edge visibility tests over all rounds
+MAX_ROUNDS = 24
+MAX_VERTICES = 1500
+MAX_EDGE_CHECKS = 400000
+
+LatLon = Tuple[float, float]
+
+
+def _nm_to_deg(nm: float, lat: float) -> float:
+    # Degrees covering at least `nm` in both axes at this latitude
+    return nm / NM_PER_DEG_LAT / max(math.cos(math.radians(lat)), 0.2)
+
+
+def _dist_nm(lon1, lat1, lon2, lat2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 3440.065 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _dist_nm_many(lon1, lat1, lons, lats) -> np.ndarray:
+    phi1, phi2 = np.radians(lat1), np.radians(lats)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lons - lon1) / 2) ** 2)
+    return 2 * 3440.065 * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+class DetourPlanner:
+    def __init__(self, geometries: Iterable, buffer_nm: float = DEFAULT_BUFFER_NM,
+                 simplify_nm: float = DEFAULT_SIMPLIFY_NM):
+        self.buffer_nm = buffer_nm
+        source_index = []  # planner obstacle -> index in the input sequence
+        outlines, keep_out = [], []
+        for i, geom in enumerate(geometries):
+            if geom is None or geom.is_empty or geom.geom_type not in ('Polygon', 'MultiPolygon'):
+                continue
+            if not geom.is_valid:
+                geom = geom.buffer(0)
+            lat = geom.centroid.y
+            buf = _nm_to_deg(buffer_nm, lat)
+            tol = _nm_to_deg(simplify_nm, lat)
+            # Buffer by the simplify tolerance too, so simplification never cuts inside the clearance
+            outlines.append(geom.buffer(buf + tol, quad_segs=2).simplify(tol, preserve_topology=True))
+            keep_out.append(geom.buffer(buf / 2, quad_segs=2).simplify(tol / 4, preserve_topology=True))
+            source_index.append(i)
+        self.source_index = np.array(source_index, dtype=np.int64)
+        self.outlines = np.array(outlines, dtype=object)
+        self.keep_out = np.array(keep_out, dtype=object)
+        shapely.prepare(self.keep_out)
+        self.tree = shapely.STRtree(self.keep_out)
+        self.vertices = [self._outline_vertices(g) for g in outlines]
+
+    def __len__(self):
+        return len(self.keep_out)
+
+    @staticmethod
+    def _outline_vertices(geom) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Convex vertices only (a shortest path never bends at a reflex one),
+        # with the ring neighbours before and after each of them. Holes count:
+        # a cluster of obstacles can enclose an endpoint.
+        parts = [shapely.geometry.polygon.orient(p, 1.0) for p in getattr(geom, 'geoms', [geom])
+                 if p.geom_type == 'Polygon' and not p.is_empty]
+        rings = [r for p in parts for r in (p.exterior, *p.interiors)]
+        coords, before, after = [], [], []
+        for r in rings:
+            # orient() leaves the polygon on the left of every ring, so a left
+            # turn is a convex corner on holes as well
+            ring = np.asarray(r.coords)[:-1]
+            if len(ring) < 3:
+                coords.append(ring), before.append(ring), after.append(ring)
+                continue
+            prev_pt, next_pt = np.roll(ring, 1, axis=0), np.roll(ring, -1, axis=0)
+            d_in, d_out = ring - prev_pt, next_pt - ring
+            convex = d_in[:, 0] * d_out[:, 1] - d_in[:, 1] * d_out[:, 0] > 0
+            coords.append(ring[convex]), before.append(prev_pt[convex]), after.append(next_pt[convex])
+        if not coords:
+            return np.empty((0, 2)), np.empty((0, 2)), np.empty((0, 2))
+        return np.concatenate(coords), np.concatenate(before), np.concatenate(after)
+
+    def _allowed_mask(self, active) -> np.ndarray:
+        # `active` is None (all obstacles), a boolean mask over the input
+        # sequence, or an iterable of input indices
+        if active is None:
+            return np.ones(len(self), dtype=bool)
+        if isinstance(active, np.ndarray) and active.dtype == bool:
+            return active[self.source_index].copy()
+        mask = np.zeros(len(self), dtype=bool)
+        lookup = {src: k for k, src in enumerate(self.source_index)}
+        for src in active:
+            k = lookup.get(src)
+            if k is not None:
+                mask[k] = True
+        return mask
+
+    def blocking(self, lat1, lon1, lat2, lon2, active=None) -> List[int]:
+        # Input indices of obstacles whose keep-out area the straight leg crosses
+        seg = LineString([(lon1, lat1), (lon2, lat2)])
+        hits = self.tree.query(seg, predicate='intersects')
+        mask = self._allowed_mask(active)
+        return [int(self.source_index[k]) for k in hits if mask[k]]
+
+    def plan(self, start: LatLon, end: LatLon, active=None, deadline=None) -> Optional[List[LatLon]]:
+        # Shortest obstacle-free path from start to end as [(lat, lon), ...] including
+        # both ends; [start, end] when the leg is clear, None if no way around was
+        # found within the work caps (or before `deadline`, anything with expired())
+        mask = self._allowed_mask(active)
+        # Obstacles that contain an endpoint cannot be avoided on this leg
+        for lat, lon in (start, end):
+            mask[self.tree.query(Point(lon, lat), predicate='intersects')] = False
+        seg = LineString([(start[1], start[0]), (end[1], end[0])])
+        in_play = set(k for k in self.tree.query(seg, predicate='intersects') if mask[k])
+        if not in_play:
+            return [start, end]
+        budget = MAX_EDGE_CHECKS
+        merged = True
+        for _ in range(MAX_ROUNDS):
+            path, blockers, used = self._search(start, end, mask, in_play, merged, budget, deadline)
+            if path is not None:
+                return path
+            budget -= used
+            if budget <= 0 or (deadline is not None and deadline.expired()):
+                return None
+            blockers -= in_play
+            if not blockers:
+                if not merged:
+                    return None
+                # Merged outlines close gaps that are still open between the
+                # keep-out areas; try once more through every obstacle's own corners
+                merged = False
+            in_play |= blockers
+        return None
+
+    def _search(self, start, end, mask, in_play, merged, budget, deadline):
+        # A* over the vertices of the in-play obstacles. Returns (path or None,
+        # obstacles worth adding next round, edges tested).
+        if merged:
+            # Overlapping obstacles contribute only the convex corners of their
+            # combined outline, and edges must meet those on a tangent
+            verts, before, after = self._outline_vertices(shapely.union_all(self.outlines[sorted(in_play)]))
+        else:
+            verts, before, after = (np.concatenate(parts) for parts in zip(*(self.vertices[k] for k in sorted(in_play))))
+        if len(verts) > MAX_VERTICES:
+            return None, set(), 0
+        ends = np.array([[start[1], start[0]], [end[1], end[0]]])
+        pts = np.concatenate([ends, verts])
+        # The endpoints are their own neighbours, so they always pass the tangent test
+        before = np.concatenate([ends, before])
+        after = np.concatenate([ends, after])
+        # Drop outline vertices that fall inside some other obstacle
+        inside = self.tree.query(shapely.points(pts[2:]), predicate='intersects')
+        bad = {int(p) + 2 for p, k in zip(*inside) if mask[k]}
+        # Obstacles that swallow a corner of the ones in play are in the way too
+        swallowed = set(int(k) for k in inside[1] if mask[k])
+        keep = [i for i in range(len(pts)) if i not in bad]
+        pts, before, after = pts[keep], before[keep], after[keep]
+        # The merged keep-out area of the obstacles in play rules most edges
+        # out in one prepared, vectorized test
+        screen = shapely.union_all(self.keep_out[sorted(in_play)])
+        shapely.prepare(screen)
+        goal = 1
+        n = len(pts)
+        h = _dist_nm_many(pts[goal][0], pts[goal][1], pts[:, 0], pts[:, 1])
+        g = np.full(n, math.inf)
+        prev = np.full(n, -1, dtype=np.int64)
+        closed = np.zeros(n, dtype=bool)
+        blockers = set(swallowed)
+        checks = 0
+        heap = [(h[0], 0.0, 0, -1)]
+        while heap:
+            _, cost, v, u = heappop(heap)
+            if closed[v]:
+                continue
+            closed[v] = True
+            g[v] = cost
+            prev[v] = u
+            if v == goal:
+                break
+            targets = np.flatnonzero(~closed)
+            if merged:
+                # A shortest path only bends at a vertex it meets on a tangent,
+                # with both ring neighbours on the same side of the incoming edge
+                d = pts[targets] - pts[v]
+                b, a = before[targets] - pts[targets], after[targets] - pts[targets]
+                side_b = d[:, 0] * b[:, 1] - d[:, 1] * b[:, 0]
+                side_a = d[:, 0] * a[:, 1] - d[:, 1] * a[:, 0]
+                targets = targets[side_b * side_a >= 0]
+            if not len(targets):
+                continue
+            checks += len(targets)
+            if checks > budget or (deadline is not None and deadline.expired()):
+                return None, blockers, checks
+            lines = shapely.linestrings(
+                np.stack([np.broadcast_to(pts[v], (len(targets), 2)), pts[targets]], axis=1))
+            clear = ~shapely.intersects(screen, lines)
+            targets, lines = targets[clear], lines[clear]
+            # The edges that survive are tested against every other obstacle in
+            # one bulk tree query; whatever blocks them joins the next round
+            line_idx, hit = self.tree.query(lines, predicate='intersects')
+            on = mask[hit]
+            blockers.update(hit[on].tolist())
+            blocked = np.zeros(len(targets), dtype=bool)
+            blocked[line_idx[on]] = True
+            targets = targets[~blocked]
+            step = cost + _dist_nm_many(pts[v][0], pts[v][1], pts[targets, 0], pts[targets, 1])
+            for w, c in zip(targets.tolist(), step.tolist()):
+                heappush(heap, (c + h[w], c, w, v))
+        if prev[goal] < 0:
+            return None, blockers, checks
+        path = []
+        node = goal
+        while node >= 0:
+            path.append((float(pts[node][1]), float(pts[node][0])))
+            node = prev[node]
+        path.reverse()
+        path[0], path[-1] = start, end
+        return path, blockers, checks
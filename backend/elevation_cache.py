@@ -0,0 +1,299 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Process-wide elevation cache shared by every request and every worker.
+#
+# Lookups are snapped to a fixed lat/lon grid so nearby sample points share a
+# cell. Each cell is looked up in a bounded in-memory LRU, then in a SQLite
+# file that all workers on the host open (WAL mode), and only then fetched
+# upstream. Concurrent lookups of the same cell are coalesced: within a process
+# through a shared future, across processes through a short-lived lease row in
+# SQLite, so there is at most one upstream request in flight per cell.
+#
+# The upstream fetch for a batch runs as its own task, so a caller that is
+# cancelled (e.g. its request timed out) never leaves coalesced waiters with
+# a false "no data". SQLite work runs in a thread to keep the event loop free
+# while another worker holds the database lock.
+
+DEFAULT_GRID_DEG = 1 / 1200  # 3 arc-seconds, about 90 m
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_LEASE_S = 10.0
+LEASE_POLL_S = 0.05
+SQL_CHUNK = 400
+
+Cell = Tuple[int, int]
+Fetcher = Callable[[float, float], Awaitable[Optional[float]]]
+
+
+class FetchSkipped(Exception):
+    # Raised by a fetcher that chose not to fetch a point (e.g. its request is
+    # out of time). Unlike a failure, other callers waiting on the same cell
+    # then fetch it themselves.
+    pass
+
+
+_SKIPPED = object()
+
+
+class ElevationCache:
+    def __init__(self, path: Optional[str] = None, grid_deg: float = DEFAULT_GRID_DEG,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, lease_s: float = DEFAULT_LEASE_S):
+        self.grid_deg = grid_deg
+        self.max_entries = max_entries
+        self.lease_s = lease_s
+        self._mem: "OrderedDict[Cell, float]" = OrderedDict()
+        self._inflight: Dict[Cell, Future] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = self._open_db(path) if path else None
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'coalesced': 0, 'fetched': 0, 'errors': 0}
+
+    def _open_db(self, path: str):
+        db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        db.execute('CREATE TABLE IF NOT EXISTS elevation '
+                   '(lat_i INTEGER, lon_i INTEGER, elev REAL, PRIMARY KEY (lat_i, lon_i)) WITHOUT ROWID')
+        db.execute('CREATE TABLE IF NOT EXISTS lease '
+                   '(lat_i INTEGER, lon_i INTEGER, expires REAL, PRIMARY KEY (lat_i, lon_i)) WITHOUT ROWID')
+        # Cells are only meaningful for the grid they were written with
+        row = db.execute("SELECT value FROM meta WHERE key = 'grid_deg'").fetchone()
+        if row is None or float(row[0]) != self.grid_deg:
+            db.execute('DELETE FROM elevation')
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('grid_deg', ?)", (repr(self.grid_deg),))
+        return db
+
+    def cell(self, lat: float, lon: float) -> Cell:
+        return (round(lat / self.grid_deg), round(lon / self.grid_deg))
+
+    def cell_center(self, cell: Cell) -> Tuple[float, float]:
+        return (round(cell[0] * self.grid_deg, 6), round(cell[1] * self.grid_deg, 6))
+
+    def hit_rate(self) -> float:
+        s = self.stats
+        hits = s['memory_hits'] + s['disk_hits'] + s['coalesced']
+        total = hits + s['fetched']
+        return hits / total if total else 0.0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            out = dict(self.stats)
+            out['memory_entries'] = len(self._mem)
+            out['inflight'] = len(self._inflight)
+        out['hit_rate'] = round(self.hit_rate(), 4)
+        out['grid_deg'] = self.grid_deg
+        out['persistent'] = self._db is not None
+        return out
+
+    # --- memory tier ---
+
+    def _remember(self, cell: Cell, elev: float):
+        # Caller holds self._lock
+        self._mem[cell] = elev
+        self._mem.move_to_end(cell)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    # --- disk tier ---
+
+    def _db_get(self, cells: List[Cell]) -> Dict[Cell, float]:
+        found = {}
+        if self._db is None or not cells:
+            return found
+        with self._db_lock:
+            for i in range(0, len(cells), SQL_CHUNK):
+                chunk = cells[i:i + SQL_CHUNK]
+                where = ' OR '.join(['(lat_i = ? AND lon_i = ?)'] * len(chunk))
+                params = [v for c in chunk for v in c]
+                for lat_i, lon_i, elev in self._db.execute(
+                        f'SELECT lat_i, lon_i, elev FROM elevation WHERE {where}', params):
+                    found[(lat_i, lon_i)] = elev
+        return found
+
+    def _db_put(self, values: Dict[Cell, float]):
+        if self._db is None or not values:
+            return
+        with self._db_lock:
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT OR REPLACE INTO elevation VALUES (?, ?, ?)',
+                                 [(c[0], c[1], e) for c, e in values.items()])
+            self._db.executemany('DELETE FROM lease WHERE lat_i = ? AND lon_i = ?', list(values))
+            self._db.execute('COMMIT')
+
+    def _db_lease(self, cells: List[Cell]) -> Tuple[List[Cell], List[Cell]]:
+        # Claim the upstream fetch for each cell unless another worker holds a live lease
+        if self._db is None:
+            return cells, []
+        now = time.time()
+        mine, theirs = [], []
+        with self._db_lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            for c in cells:
+                cur = self._db.execute(
+                    'INSERT INTO lease VALUES (?, ?, ?) ON CONFLICT (lat_i, lon_i) '
+                    'DO UPDATE SET expires = excluded.expires WHERE lease.expires < ?',
+                    (c[0], c[1], now + self.lease_s, now))
+                (mine if cur.rowcount else theirs).append(c)
+            self._db.execute('COMMIT')
+        return mine, theirs
+
+    def _db_release(self, cells: Iterable[Cell]):
+        cells = list(cells)
+        if self._db is None or not cells:
+            return
+        with self._db_lock:
+            self._db.executemany('DELETE FROM lease WHERE lat_i = ? AND lon_i = ?', cells)
+
+    def _db_leased(self, cells: List[Cell]) -> set:
+        # Cells another worker still holds a live lease on
+        if self._db is None or not cells:
+            return set()
+        now = time.time()
+        leased = set()
+        with self._db_lock:
+            for i in range(0, len(cells), SQL_CHUNK):
+                chunk = cells[i:i + SQL_CHUNK]
+                where = ' OR '.join(['(lat_i = ? AND lon_i = ?)'] * len(chunk))
+                params = [v for c in chunk for v in c]
+                for lat_i, lon_i in self._db.execute(
+                        f'SELECT lat_i, lon_i FROM lease WHERE expires >= ? AND ({where})', [now] + params):
+                    leased.add((lat_i, lon_i))
+        return leased
+
+    async def _db_call(self, fn, *args):
+        # SQLite calls can block on another worker's lock; keep them off the event loop
+        if self._db is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def _await_other_workers(self, cells: List[Cell], deadline=None) -> Dict[Cell, float]:
+        # Poll for values another worker holds leases on, for at most lease_s
+        # and never past the caller's deadline (anything with remaining())
+        found: Dict[Cell, float] = {}
+        wait_s = self.lease_s if deadline is None else min(self.lease_s, deadline.remaining())
+        until = time.monotonic() + wait_s
+        pending = list(cells)
+        while pending and time.monotonic() < until:
+            await asyncio.sleep(min(LEASE_POLL_S, max(0.0, until - time.monotonic())))
+            got = await self._db_call(self._db_get, pending)
+            found.update(got)
+            pending = [c for c in pending if c not in got]
+            # A released lease with no value means that worker gave up on the cell
+            leased = await self._db_call(self._db_leased, pending)
+            pending = [c for c in pending if c in leased]
+        return found
+
+    # --- lookup ---
+
+    async def get_many(self, points: Iterable[Tuple[float, float]], fetch: Fetcher,
+                       deadline=None) -> Dict[Tuple[float, float], Optional[float]]:
+        # Returns {point: elevation or None if upstream failed}. With a
+        # deadline, cells still unresolved when it expires come back as None.
+        point_cells = {p: self.cell(*p) for p in points}
+        values: Dict[Cell, Optional[float]] = {}
+        waiting: Dict[Cell, Future] = {}
+        owned: Dict[Cell, Future] = {}
+        with self._lock:
+            for c in set(point_cells.values()):
+                if c in self._mem:
+                    self._mem.move_to_end(c)
+                    values[c] = self._mem[c]
+                    self.stats['memory_hits'] += 1
+                elif c in self._inflight:
+                    waiting[c] = self._inflight[c]
+                    self.stats['coalesced'] += 1
+                else:
+                    owned[c] = self._inflight[c] = Future()
+        if owned:
+            # Detached from this caller: if it is cancelled, the fetch still
+            # completes for everyone coalesced onto these cells
+            task = asyncio.ensure_future(self._resolve(owned, fetch, deadline))
+            task.add_done_callback(lambda _: self._settle(owned))
+            await asyncio.shield(task)
+        for c, fut in owned.items():
+            values[c] = fut.result()
+        retry = []
+        for c, fut in waiting.items():
+            timeout = None if deadline is None else deadline.remaining()
+            try:
+                values[c] = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout)
+            except asyncio.TimeoutError:
+                # Out of time: leave the cell to its owner
+                values[c] = _SKIPPED
+                continue
+            if values[c] is _SKIPPED:
+                retry.append(c)
+        if retry and (deadline is None or deadline.remaining() > 0):
+            # The owner skipped these cells; fetch them on our own account
+            again = await self.get_many([self.cell_center(c) for c in retry], fetch, deadline)
+            for c in retry:
+                values[c] = again[self.cell_center(c)]
+        return {p: (None if values.get(c) is _SKIPPED else values.get(c)) for p, c in point_cells.items()}
+
+    def _settle(self, owned: Dict[Cell, Future]):
+        # Never leave a future unresolved, or coalesced callers would hang;
+        # this only sets None if the fetch task itself failed or was torn down
+        with self._lock:
+            for c, fut in owned.items():
+                if self._inflight.get(c) is fut:
+                    del self._inflight[c]
+                if not fut.done():
+                    fut.set_result(None)
+
+    async def _resolve(self, owned: Dict[Cell, Future], fetch: Fetcher, deadline=None):
+        cells = list(owned)
+        results: Dict[Cell, Optional[float]] = await self._db_call(self._db_get, cells)
+        self.stats['disk_hits'] += len(results)
+        missing = [c for c in cells if c not in results]
+        mine, theirs = await self._db_call(self._db_lease, missing)
+        if mine:
+            good = await self._fetch_cells(mine, fetch, results)
+            await self._db_call(self._db_put, good)
+            await self._db_call(self._db_release, [c for c in mine if c not in good])
+        if theirs:
+            self.stats['coalesced'] += len(theirs)
+            results.update(await self._await_other_workers(theirs, deadline))
+            # The other worker gave up or failed: fetch ourselves rather than return nothing
+            late = [c for c in theirs if c not in results]
+            if late:
+                good = await self._fetch_cells(late, fetch, results)
+                await self._db_call(self._db_put, good)
+        with self._lock:
+            for c, fut in owned.items():
+                elev = results.get(c)
+                if elev is not None and elev is not _SKIPPED:
+                    self._remember(c, elev)
+                fut.set_result(elev)
+
+    async def _fetch_cells(self, cells: List[Cell], fetch: Fetcher, results: Dict) -> Dict[Cell, float]:
+        # Fetch upstream into results; returns the cells that got a value
+        fetched = await asyncio.gather(*[fetch(*self.cell_center(c)) for c in cells], return_exceptions=True)
+        good = {}
+        for c, elev in zip(cells, fetched):
+            if isinstance(elev, FetchSkipped):
+                results[c] = _SKIPPED
+                continue
+            self.stats['fetched'] += 1
+            if isinstance(elev, BaseException) or elev is None:
+                self.stats['errors'] += 1
+                results[c] = None
+            else:
+                results[c] = good[c] = elev
+        return good
+
+
+def from_env() -> ElevationCache:
+    path = os.environ.get('ELEVATION_CACHE_PATH',
+                          os.path.join(os.path.dirname(__file__), 'elevation_cache.sqlite3'))
+    return ElevationCache(
+        path=path or None,
+        grid_deg=float(os.environ.get('ELEVATION_CACHE_GRID_DEG', DEFAULT_GRID_DEG)),
+        max_entries=int(os.environ.get('ELEVATION_CACHE_SIZE', DEFAULT_MAX_ENTRIES)),
+    )
@@ -1,16 +1,15 @@
 from fastapi import FastAPI, Query, Request, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-import pandas as pd
-import geopandas as gpd
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import os
-import requests
+import sys
 import math
 import httpx
-from shapely.geometry import LineString, Point, shape
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.gzip import GZipMiddleware
 import json
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 import asyncio
 from functools import lru_cache
 import csv
@@ -19,12 +18,52 @@ from fastapi.exception_handlers import RequestValidationError
 from fastapi.exceptions import RequestValidationError as FastAPIRequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from array import array
+from elevation_cache import FetchSkipped, from_env as elevation_cache_from_env
+from serialization import FastJSONResponse, compact_weather, dumps, encode_feature, feature_collection, trim_coords
 
-app = FastAPI()
+# 'eager' loads all data at import time; 'background' lets uvicorn bind at
+# once and loads in a background thread while /readyz reports progress
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+STARTUP_RETRY_AFTER_S = int(os.environ.get('STARTUP_RETRY_AFTER_S', '5'))
+startup_state = {'status': 'starting', 'stage': None, 'progress': 0.0, 'error': None, 'load_seconds': None}
+# Endpoints served while data is still loading
+READINESS_EXEMPT_PATHS = {'/', '/healthz', '/readyz', '/docs', '/openapi.json', '/elevation-cache/stats'}
+
+@asynccontextmanager
+async def lifespan(app):
+    if STARTUP_MODE == 'background' and startup_state['status'] == 'starting':
+        threading.Thread(target=load_all, name='data-loader', daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Set up logging
 logger = logging.getLogger("uvicorn.error")
 
+# Answer data-backed requests with a fast 503 until loading has finished.
+# Registered before CORS so the 503 still carries CORS headers.
+@app.middleware("http")
+async def readiness_gate(request: Request, call_next):
+    if startup_state['status'] != 'ready' and request.url.path not in READINESS_EXEMPT_PATHS:
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": str(STARTUP_RETRY_AFTER_S)},
+            content={
+                "error": {
+                    "type": "ServiceUnavailable",
+                    "message": "Data is still loading. Please retry shortly." if startup_state['status'] != 'failed'
+                               else "Data failed to load.",
+                    "stage": startup_state['stage'],
+                    "progress": startup_state['progress'],
+                }
+            },
+        )
+    return await call_next(request)
+
 # Add CORS middleware to allow frontend to access backend
 app.add_middleware(
     CORSMiddleware,
@@ -34,89 +73,167 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load airports.csv
-csv_airports = []
-with open(os.path.join(os.path.dirname(__file__), 'airports.csv')) as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        csv_airports.append(row)
-
-# Load airports_us.json
-with open(os.path.join(os.path.dirname(__file__), 'airports_us.json')) as f:
-    json_airports = json.load(f)
-
-# Index JSON airports by all codes and by (lat, lon)
-json_code_index = {}
-json_latlon_index = {}
-for row in json_airports:
-    for field in ['icaoCode', 'gpsCode', 'localCode', 'id']:
-        code = row.get(field)
-        if code:
-            json_code_index[str(code).upper()] = row
-    # Index by rounded lat/lon
-    coords = row.get('geometry', {}).get('coordinates')
-    if coords and len(coords) == 2:
-        latlon = (round(float(coords[1]), 4), round(float(coords[0]), 4))
-        json_latlon_index[latlon] = row
-
-# Merge CSV and JSON
+# Compress responses over COMPRESS_MIN_BYTES: brotli for clients that accept
+# it, gzip for the rest
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True)
+except ImportError:  # pragma: no cover - brotli-asgi is in requirements.txt
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+# Data loaded by load_all(); empty until the app is ready
+json_airports = []
 merged_airports = []
 code_to_row = {}
-for csv_row in csv_airports:
-    codes = []
-    for field in ['ident', 'gps_code', 'local_code', 'icao_code']:
-        code = csv_row.get(field)
-        if code:
-            codes.append(code.upper())
-    # Try to find JSON match by code
-    json_row = None
-    for code in codes:
-        if code in json_code_index:
-            json_row = json_code_index[code]
-            break
-    # If not found, try by lat/lon
-    if not json_row:
-        try:
-            lat = round(float(csv_row['latitude_deg']), 4)
-            lon = round(float(csv_row['longitude_deg']), 4)
-            json_row = json_latlon_index.get((lat, lon))
-        except Exception:
-            pass
-    # Merge fields
-    merged = dict(csv_row)
-    if json_row:
-        merged['openaip'] = json_row
-    else:
-        print(f"[WARN] No OpenAIP metadata for {csv_row.get('name')} ({codes})")
-    merged_airports.append(merged)
-    for code in codes:
-        code_to_row[code] = merged
+airport_search_index = None
+corridor_index = None
+airspace_features = []  # pre-encoded GeoJSON Feature bytes, row-aligned with airspace_index
+airspace_index = None
+detour_planner = None
+waypoints = []
+nodes = []
+node_graph = {}
+node_by_id = {}
+
+def load_airports():
+    global json_airports, merged_airports, code_to_row, airport_search_index, corridor_index
+    from airport_search import AirportSearchIndex
+    from corridor import CorridorIndex
+    # Load airports.csv
+    csv_airports = []
+    with open(os.path.join(os.path.dirname(__file__), 'airports.csv')) as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            csv_airports.append(row)
+
+    # Load airports_us.json
+    with open(os.path.join(os.path.dirname(__file__), 'airports_us.json')) as f:
+        json_rows = json.load(f)
+
+    # Index JSON airports by all codes and by (lat, lon)
+    json_code_index = {}
+    json_latlon_index = {}
+    for row in json_rows:
+        for field in ['icaoCode', 'gpsCode', 'localCode', 'id']:
+            code = row.get(field)
+            if code:
+                json_code_index[str(code).upper()] = row
+        # Index by rounded lat/lon
+        coords = row.get('geometry', {}).get('coordinates')
+        if coords and len(coords) == 2:
+            latlon = (round(float(coords[1]), 4), round(float(coords[0]), 4))
+            json_latlon_index[latlon] = row
+
+    # Merge CSV and JSON
+    merged_rows = []
+    codes_index = {}
+    for csv_row in csv_airports:
+        codes = []
+        for field in ['ident', 'gps_code', 'local_code', 'icao_code']:
+            code = csv_row.get(field)
+            if code:
+                codes.append(code.upper())
+        # Try to find JSON match by code
+        json_row = None
+        for code in codes:
+            if code in json_code_index:
+                json_row = json_code_index[code]
+                break
+        # If not found, try by lat/lon
+        if not json_row:
+            try:
+                lat = round(float(csv_row['latitude_deg']), 4)
+                lon = round(float(csv_row['longitude_deg']), 4)
+                json_row = json_latlon_index.get((lat, lon))
+            except Exception:
+                pass
+        # Merge fields
+        merged = dict(csv_row)
+        if json_row:
+            merged['openaip'] = json_row
+        else:
+            print(f"[WARN] No OpenAIP metadata for {csv_row.get('name')} ({codes})")
+        merged_rows.append(merged)
+        for code in codes:
+            codes_index[code] = merged
+
+    # Prefix index for ICAO/name autocomplete
+    search_index = AirportSearchIndex(merged_rows)
+    print(f"[SEARCH] Indexed {len(search_index)} airports for typeahead")
+
+    # Spatial index of usable landing sites for corridor / nearest-airport queries
+    landing = []
+    for row in json_rows:
+        code = row.get('icaoCode') or row.get('gpsCode') or row.get('localCode')
+        coords = row.get('geometry', {}).get('coordinates')
+        if not code or not coords or len(coords) != 2 or not is_public_open_airport(row, verbose=False):
+            continue
+        landing.append((str(code).upper(), row.get('name', code), float(coords[1]), float(coords[0]), is_likely_fuel_airport(row)))
+    landing_index = CorridorIndex(*zip(*landing)) if landing else CorridorIndex([], [], [], [])
+    print(f"[CORRIDOR] Indexed {len(landing_index)} public airports")
+    json_airports, merged_airports, code_to_row, airport_search_index = json_rows, merged_rows, codes_index, search_index
+    corridor_index = landing_index
 
-# Load OpenAIP airspaces
 AIRSPACES_JSON = os.path.join(os.path.dirname(__file__), 'airspaces_us.json')
-with open(AIRSPACES_JSON, 'r') as f:
-    airspaces_data = json.load(f)
-# Convert to GeoDataFrame
-features = []
-for asp in airspaces_data:
-    if 'geometry' in asp and asp['geometry']:
+
+def load_airspaces():
+    global airspace_features, airspace_index, detour_planner
+    # Heavy geo stack is only imported once loading starts
+    from shapely.geometry import shape
+    from airspace_index import AirspaceIndex, UNLIMITED_FT, ground_estimates_ft, parse_limit_ft
+    from detour import DetourPlanner
+    # Load OpenAIP airspaces
+    with open(AIRSPACES_JSON, 'r') as f:
+        airspaces_data = json.load(f)
+    shaped = []
+    for asp in airspaces_data:
+        if 'geometry' in asp and asp['geometry']:
+            try:
+                shaped.append((asp, shape(asp['geometry'])))
+            except Exception:
+                continue
+    # AGL ceilings sit over the highest airport in or near each airspace
+    fields = []
+    for row in merged_airports:
+        try:
+            fields.append((float(row['latitude_deg']), float(row['longitude_deg']), float(row['elevation_ft'])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    lats, lons, elevations = zip(*fields) if fields else ((), (), ())
+    ground = ground_estimates_ft([geom for _, geom in shaped], lats, lons, elevations)
+    features = []
+    encoded = []
+    for (asp, geom), ground_ft in zip(shaped, ground.tolist()):
         try:
-            features.append({
-                'geometry': shape(asp['geometry']),
+            feature = {
+                'geometry': geom,
                 'name': asp.get('name'),
                 'class': asp.get('category'),
                 'type': asp.get('type'),
+                'icao_class': asp.get('icaoClass'),
                 'id': asp.get('id'),
-            })
+                'lower_ft': parse_limit_ft(asp.get('lowerLimit'), 0.0),
+                'upper_ft': parse_limit_ft(asp.get('upperLimit'), UNLIMITED_FT, ground_ft=ground_ft),
+            }
+            properties = {k: v for k, v in feature.items() if k != 'geometry'}
+            encoded.append(encode_feature(asp['geometry'], properties))
+            features.append(feature)
         except Exception:
             continue
-if features:
-    airspaces_gdf = gpd.GeoDataFrame(features, crs="EPSG:4326")
-else:
-    airspaces_gdf = gpd.GeoDataFrame([], crs="EPSG:4326")
+    print(f"[AIRSPACES] Encoded {len(encoded)} airspace features ({sum(map(len, encoded)) / 1e6:.1f} MB)")
+    # 2D R-tree plus floor/ceiling per airspace, row-aligned with airspace_features
+    index = AirspaceIndex.from_features(features)
+    # Buffered, simplified and prepared obstacle geometry for detour planning
+    planner = DetourPlanner([f['geometry'] for f in features])
+    print(f"[DETOUR] Prepared {len(planner)} airspace obstacles")
+    airspace_features, airspace_index, detour_planner = encoded, index, planner
 
 OPENWEATHERMAP_API_KEY = os.environ.get('OPENWEATHERMAP_API_KEY', '')
 
+# Elevation cache shared by all requests (and, via SQLite, all workers)
+elevation_cache = elevation_cache_from_env()
+
 def get_airport_info(icao):
     code = icao.upper()
     row = code_to_row.get(code)
@@ -149,26 +266,56 @@ def get_airport_info(icao):
 def read_root():
     return {"message": "Backend is running"}
 
+@app.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving. A failed data load never
+    # recovers on its own, so report it and let the orchestrator restart us.
+    if startup_state['status'] == 'failed':
+        return JSONResponse(status_code=503, content=dict(startup_state))
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    # Readiness: 200 once all data is loaded, 503 with progress until then
+    body = dict(startup_state)
+    if startup_state['status'] == 'ready':
+        return body
+    return JSONResponse(status_code=503, content=body, headers={"Retry-After": str(STARTUP_RETRY_AFTER_S)})
+
 @app.get("/airport/{icao}")
 def airport_lookup(icao: str):
     return get_airport_info(icao)
 
-class RouteRequest(BaseModel):
-    origin: str
-    destination: str
-    speed: float
+@app.get("/airports/search")
+def airport_search(q: str = Query(..., min_length=1, max_length=64), limit: int = Query(10, ge=1, le=50)):
+    from airport_search import compact_result
+    results = airport_search_index.search(q, limit)
+    return {"query": q, "results": [compact_result(a) for a in results]}
+
+class FlightConstraints(BaseModel):
+    # Aircraft and flight settings shared by every request that searches the graph
+    speed: float = Field(..., gt=0)
     speed_unit: str = 'knots'
     altitude: int
     avoid_airspaces: bool
     avoid_terrain: bool
     max_leg_distance: float = 150.0  # nm, default value
-    plan_fuel_stops: bool = False
     aircraft_range_nm: float = None
+    time_budget_s: Optional[float] = None  # seconds; server default when omitted
 
-def is_public_open_airport(row):
+class RouteRequest(FlightConstraints):
+    origin: str
+    destination: str
+    plan_fuel_stops: bool = False
+    alternatives: int = Field(0, ge=0, le=5)  # extra routes to return besides the best one
+    glide_ratio: float = Field(9.0, gt=0)  # sets the corridor_airports radius from height above the route's highest ground
+    corridor_nm: Optional[float] = Field(None, ge=0)  # explicit corridor radius instead of gliding distance
+
+def is_public_open_airport(row, verbose=True):
     # OpenAIP: 'private' == False for public-use
     if row.get('private', True):
-        print(f"Skipping {row.get('name')} ({row.get('icaoCode')}) - private")
+        if verbose:
+            print(f"Skipping {row.get('name')} ({row.get('icaoCode')}) - private")
         return False
     # Ignore 'status' check (not present in OpenAIP)
     runways = row.get('runways', [])
@@ -185,7 +332,8 @@ def is_public_open_airport(row):
         except Exception as e:
             print(f"Error checking runway: {e}")
             continue
-    print(f"Skipping {row.get('name')} ({row.get('icaoCode')}) - no suitable runway")
+    if verbose:
+        print(f"Skipping {row.get('name')} ({row.get('icaoCode')}) - no suitable runway")
     return False
 
 def is_likely_fuel_airport(row):
@@ -216,81 +364,70 @@ def is_likely_fuel_airport(row):
     return False
 
 def find_nearest_airport(lat, lon, exclude_codes, fuel_only=False):
-    min_dist = float('inf')
-    nearest = None
-    for code, row in code_to_row.items():
-        if code in exclude_codes:
-            continue
-        if not is_public_open_airport(row):
-            continue
-        if fuel_only and not is_likely_fuel_airport(row):
-            continue
-        coords = row['geometry']['coordinates']
-        alat, alon = coords[1], coords[0]
-        dist = haversine(lat, lon, alat, alon)
-        if dist < min_dist:
-            min_dist = dist
-            nearest = (alat, alon, code, row.get('name', code))
-    return nearest
-
-def avoid_airspaces(route_points: List[Tuple[float, float]], buffer_nm=5.0) -> List[Tuple[float, float]]:
-    # Iteratively add detours until no segment intersects any airspace
-    changed = True
-    max_iter = 10
-    iter_count = 0
-    while changed and iter_count < max_iter:
-        changed = False
-        new_points = [route_points[0]]
-        for i in range(len(route_points) - 1):
-            seg = LineString([(route_points[i][1], route_points[i][0]), (route_points[i+1][1], route_points[i+1][0])])
-            intersecting = airspaces_gdf[airspaces_gdf.intersects(seg)]
-            if not intersecting.empty:
-                # Find the first airspace, add a detour just outside its boundary
-                asp = intersecting.iloc[0]
-                boundary = asp.geometry.boundary
-                # Find closest point on boundary to segment midpoint
-                mid = seg.interpolate(0.5, normalized=True)
-                closest = boundary.interpolate(boundary.project(mid))
-                # Offset detour by buffer_nm (approx 0.0167 deg per nm)
-                offset_lat = closest.y + buffer_nm * 0.0167
-                offset_lon = closest.x + buffer_nm * 0.0167
-                new_points.append((offset_lat, offset_lon))
-                new_points.append(route_points[i+1])
-                changed = True
-                break
-            else:
-                new_points.append(route_points[i+1])
-        if changed:
-            route_points = new_points
-        iter_count += 1
-    return route_points
-
-async def fetch_elevation_batch(points: List[Tuple[float, float]], client, cache: Dict) -> Dict[Tuple[float, float], float]:
-    # Fetch elevations for all points, using cache where possible
-    results = {}
-    tasks = []
-    for lat, lon in points:
-        key = (round(lat, 5), round(lon, 5))
-        if key in cache:
-            results[key] = cache[key]
-        else:
-            url = f"https://portal.opentopography.org/API/globaldem?demtype=SRTMGL1&south={lat}&north={lat}&west={lon}&east={lon}&outputFormat=JSON"
-            tasks.append((key, client.get(url, timeout=5)))
-    if tasks:
-        responses = await asyncio.gather(*[t[1] for t in tasks], return_exceptions=True)
-        for (key, _), resp in zip(tasks, responses):
-            elev = 0
+    found = corridor_index.nearest(lat, lon, exclude_codes, fuel_only)
+    if found is None:
+        return None
+    return (found['lat'], found['lon'], found['icao'], found['name'])
+
+def avoid_airspaces(route_points: List[Tuple[float, float]], route_names: List[str], band=None,
+                    deadline=None) -> Tuple[List[Tuple[float, float]], List[str]]:
+    # Re-plan every leg that crosses an airspace around it, in a single pass.
+    # With an altitude band only airspaces overlapping it are avoided. Legs
+    # still unplanned when the deadline expires are kept direct.
+    active = airspace_index.band_mask(band) if band is not None else None
+    new_points = [route_points[0]]
+    new_names = [route_names[0]]
+    for i in range(len(route_points) - 1):
+        path = detour_planner.plan(route_points[i], route_points[i+1], active, deadline)
+        if path is None:
+            if deadline is None or not deadline.expired():
+                logger.warning(f"[DETOUR] No clear path from {route_names[i]} to {route_names[i+1]}, keeping direct leg")
+            path = [route_points[i], route_points[i+1]]
+        for point in path[1:-1]:
+            new_points.append(point)
+            new_names.append('DETOUR')
+        new_points.append(route_points[i+1])
+        new_names.append(route_names[i+1])
+    return new_points, new_names
+
+# OpenTopography SRTM API (public, no key needed for demo)
+def elevation_url(lat, lon):
+    return f"https://portal.opentopography.org/API/globaldem?demtype=SRTMGL1&south={lat}&north={lat}&west={lon}&east={lon}&outputFormat=JSON"
+
+# Upstream elevation requests in flight per batch; the client pool matches, so
+# request timeouts never include time spent queueing for a connection
+ELEVATION_FETCH_CONCURRENCY = int(os.environ.get('ELEVATION_FETCH_CONCURRENCY', '16'))
+ELEVATION_FETCH_TIMEOUT_S = 5.0
+
+def elevation_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=ELEVATION_FETCH_CONCURRENCY, max_keepalive_connections=ELEVATION_FETCH_CONCURRENCY)
+    return httpx.AsyncClient(limits=limits)
+
+async def fetch_elevation_batch(points: List[Tuple[float, float]], client, default=0, deadline=None) -> Dict[Tuple[float, float], float]:
+    # Fetch elevations for all points through the shared cache; failed lookups
+    # get `default`. With a Deadline, no request starts after it expires and
+    # none outlives it, so the batch returns on time with whatever it has.
+    slots = asyncio.Semaphore(ELEVATION_FETCH_CONCURRENCY)
+    async def fetch_one(lat, lon):
+        async with slots:
+            timeout = ELEVATION_FETCH_TIMEOUT_S
+            if deadline is not None:
+                timeout = min(timeout, deadline.remaining())
+                if timeout <= 0:
+                    # Not a failure: anyone else waiting on this cell fetches it
+                    raise FetchSkipped()
             try:
-                if isinstance(resp, Exception):
-                    elev = 0
-                elif resp.status_code == 200:
+                resp = await client.get(elevation_url(lat, lon), timeout=timeout)
+                if resp.status_code == 200:
                     j = resp.json()
-                    elev = j['data'][0][2] if 'data' in j and j['data'] else 0
+                    # An empty answer is not sea level; leave it uncached
+                    return j['data'][0][2] if 'data' in j and j['data'] else None
             except Exception:
-                elev = 0
-            results[key] = elev
-            cache[key] = elev
-    return results
+                pass
+            return None
+    keys = [(round(lat, 5), round(lon, 5)) for lat, lon in points]
+    found = await elevation_cache.get_many(keys, fetch_one, deadline)
+    return {key: (default if found.get(key) is None else found[key]) for key in keys}
 
 def get_leg_sample_points(lat1, lon1, lat2, lon2, interval_nm=10) -> List[Tuple[float, float]]:
     n_samples = max(2, int(haversine(lat1, lon1, lat2, lon2) // interval_nm) + 1)
@@ -299,42 +436,70 @@ def get_leg_sample_points(lat1, lon1, lat2, lon2, interval_nm=10) -> List[Tuple[
         lon1 + (i / (n_samples - 1)) * (lon2 - lon1)
     ) for i in range(n_samples)]
 
-async def get_all_leg_vfr_altitudes(legs: List[Tuple[Tuple[float, float], Tuple[float, float]]], min_vfr_alt=3500, step=1000) -> List[int]:
+MAX_VFR_ALTITUDE = 17500
+
+async def get_all_leg_vfr_altitudes(legs: List[Tuple[Tuple[float, float], Tuple[float, float]]], min_vfr_alt=3500, step=1000, fetch_terrain=True,
+                                    deadline=None) -> Tuple[List[int], List[int], List[float]]:
+    # Returns (VFR altitude per leg, indices of legs no altitude up to
+    # MAX_VFR_ALTITUDE clears of airspace; those keep the terrain altitude,
+    # highest sampled terrain per leg; 0 where nothing was fetched)
     # Collect all sample points
     all_points = []
     for (lat1, lon1), (lat2, lon2) in legs:
         all_points.extend(get_leg_sample_points(lat1, lon1, lat2, lon2))
     # Remove duplicates
     all_points = list({(round(lat, 5), round(lon, 5)) for lat, lon in all_points})
-    cache = {}
-    async with httpx.AsyncClient() as client:
-        elevations = await fetch_elevation_batch(all_points, client, cache)
+    elevations = {}
+    if fetch_terrain:
+        async with elevation_client() as client:
+            elevations = await fetch_elevation_batch(all_points, client, deadline=deadline)
     # Now calculate per-leg VFR altitudes
     vfr_alts = []
-    for (lat1, lon1), (lat2, lon2) in legs:
+    blocked = []
+    terrain = []
+    for i, ((lat1, lon1), (lat2, lon2)) in enumerate(legs):
         samples = get_leg_sample_points(lat1, lon1, lat2, lon2)
         max_terrain = 0
-        max_airspace_floor = 0
         for lat, lon in samples:
             key = (round(lat, 5), round(lon, 5))
             elev = elevations.get(key, 0)
             if elev > max_terrain:
                 max_terrain = elev
-            pt = Point(lon, lat)
-            intersecting = airspaces_gdf[airspaces_gdf.contains(pt)]
-            for _, asp in intersecting.iterrows():
-                floor = asp.get('lowerLimit', 0)
-                if isinstance(floor, str):
-                    try:
-                        floor = int(floor.replace('ft', '').replace(' ', ''))
-                    except Exception:
-                        floor = 0
-                if floor > max_airspace_floor:
-                    max_airspace_floor = floor
-        needed = max(max_terrain + 1000, max_airspace_floor + 500)
+        terrain.append(max_terrain)
+        needed = max_terrain + 1000
         vfr = max(min_vfr_alt, int((needed + step - 1) // step * step))
+        # Climb until the leg clears every airspace it would cross; airspace
+        # around the leg's own endpoints can't be avoided and is ignored
+        exempt = airspace_index.containing_any([(lat1, lon1), (lat2, lon2)])
+        clear = airspace_index.lowest_clear_altitude(lat1, lon1, lat2, lon2, vfr, step, MAX_VFR_ALTITUDE, exempt)
+        if clear is not None:
+            vfr = int(clear)
+        else:
+            blocked.append(i)
         vfr_alts.append(vfr)
-    return vfr_alts
+    return vfr_alts, blocked, terrain
+
+def great_circle_points(lat1, lon1, lat2, lon2, spacing_nm) -> List[Tuple[float, float, float]]:
+    # Points every spacing_nm along the great circle, as (lat, lon, distance from start)
+    dist = haversine(lat1, lon1, lat2, lon2)
+    n = max(1, math.ceil(dist / spacing_nm))
+    phi1, lam1, phi2, lam2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    delta = dist / 3440.065
+    if delta < 1e-9:
+        return [(lat1, lon1, 0.0), (lat2, lon2, dist)]
+    sin_delta = math.sin(delta)
+    x1, y1, z1 = math.cos(phi1) * math.cos(lam1), math.cos(phi1) * math.sin(lam1), math.sin(phi1)
+    x2, y2, z2 = math.cos(phi2) * math.cos(lam2), math.cos(phi2) * math.sin(lam2), math.sin(phi2)
+    points = []
+    for i in range(n + 1):
+        f = i / n
+        a = math.sin((1 - f) * delta) / sin_delta
+        b = math.sin(f * delta) / sin_delta
+        x, y, z = a * x1 + b * x2, a * y1 + b * y2, a * z1 + b * z2
+        lat = math.degrees(math.atan2(z, math.hypot(x, y)))
+        lon = math.degrees(math.atan2(y, x))
+        points.append((lat, lon, f * dist))
+    return points
 
 def closest_node(lat, lon, nodes):
     min_dist = float('inf')
@@ -346,8 +511,233 @@ def closest_node(lat, lon, nodes):
             closest = n
     return closest
 
+class Deadline:
+    # Cooperative time budget for one request: searches poll expired() and
+    # upstream fetches are bounded by remaining(); cancel() ends both early
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires = time.monotonic() + budget_s
+        self.cancelled = False
+
+    def remaining(self) -> float:
+        return 0.0 if self.cancelled else max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.cancelled or time.monotonic() >= self.expires
+
+    def cancel(self):
+        self.cancelled = True
+
+ROUTE_TIME_BUDGET_S = float(os.environ.get('ROUTE_TIME_BUDGET_S', '20'))
+MAX_TIME_BUDGET_S = float(os.environ.get('MAX_TIME_BUDGET_S', '60'))
+WEATHER_TIME_BUDGET_S = float(os.environ.get('WEATHER_TIME_BUDGET_S', '10'))
+
+def request_deadline(budget_s: Optional[float], default_s: float) -> Deadline:
+    budget = budget_s if budget_s and budget_s > 0 else default_s
+    return Deadline(min(budget, MAX_TIME_BUDGET_S))
+
+async def cancel_on_disconnect(request: Request, deadline: Deadline, poll_s=0.25):
+    # Cancel the deadline as soon as the client goes away
+    while not deadline.expired():
+        if await request.is_disconnected():
+            logger.info("[DEADLINE] Client disconnected, cancelling work")
+            deadline.cancel()
+            return
+        await asyncio.sleep(poll_s)
+
+async def gather_within(coros, deadline: Deadline, default=None):
+    # Run coroutines concurrently until the deadline; unfinished ones are
+    # cancelled and yield `default`. Returns (results, all_finished).
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    if not tasks:
+        return [], True
+    done, pending = await asyncio.wait(tasks, timeout=deadline.remaining())
+    for t in pending:
+        t.cancel()
+    results = []
+    for t in tasks:
+        if t in done and not t.cancelled() and t.exception() is None:
+            results.append(t.result())
+        else:
+            results.append(default)
+    return results, not pending
+
+def route_edge_filter(req: FlightConstraints, origin_info, dest_info):
+    # Edge predicate shared by every search that follows the request's constraints
+    from airspace_index import cruise_band
+    max_leg = req.max_leg_distance or 150.0
+    aircraft_range = req.aircraft_range_nm or 9999
+    # Only airspaces overlapping the cruise altitude band block an edge; the
+    # ones around the departure and arrival fields are unavoidable
+    band = cruise_band(req.altitude)
+    exempt = airspace_index.containing_any([(origin_info['lat'], origin_info['lon']), (dest_info['lat'], dest_info['lon'])])
+
+    def edge_ok(n1, n2, distance):
+        if distance > max_leg or distance > aircraft_range:
+            return False
+        if req.avoid_airspaces:
+            if len(airspace_index.conflicts(n1['lat'], n1['lon'], n2['lat'], n2['lon'], band, exempt)):
+                return False
+        if req.avoid_terrain:
+            samples = get_leg_sample_points(n1['lat'], n1['lon'], n2['lat'], n2['lon'])
+            for lat, lon in samples:
+                elev = 0  # TODO: use cached or fast elevation lookup
+                if elev > req.altitude - 1000:
+                    return False
+        return True
+    return edge_ok
+
+def shortest_path_tree(source_id, edge_ok, deadline: Optional[Deadline] = None, target_id=None,
+                       max_cost=math.inf, max_legs=None, target_stretch=None) -> Dict:
+    # Dijkstra over node_graph from source_id. Stops at target_id when given
+    # (or, with target_stretch, keeps growing the tree up to stretch x the
+    # target's cost), never extends past max_cost / max_legs, and checks the
+    # deadline before settling each node. 'settled' lists nodes in order of
+    # final cost.
+    # With max_legs the search runs over (node, legs) labels: a costlier way
+    # into a node that uses fewer legs can be the only one with legs to spare
+    # for what lies beyond it. A node's cost is that of its cheapest label,
+    # and 'label' maps it to that label for tree_path.
+    bounded = max_legs is not None
+    root = (source_id, 0) if bounded else source_id
+    cost_to = {root: 0.0}
+    prev = {root: None}
+    hops = {root: 0}
+    dist, legs, label = {}, {}, {}
+    fewest = {}
+    settled = []
+    done = set()
+    heap = [(0.0, root)]
+    status = 'complete'
+    while heap:
+        if deadline is not None and deadline.expired():
+            if status != 'target':
+                status = 'cancelled' if deadline.cancelled else 'deadline'
+            break
+        cost, key = heappop(heap)
+        if key in done:
+            continue
+        if cost > max_cost:
+            break
+        done.add(key)
+        nid = key[0] if bounded else key
+        if bounded:
+            # A later label only opens anything new if it used fewer legs
+            if hops[key] >= fewest.get(nid, math.inf):
+                continue
+            fewest[nid] = hops[key]
+        if nid not in dist:
+            dist[nid], legs[nid], label[nid] = cost, hops[key], key
+            settled.append(nid)
+            if nid == target_id:
+                status = 'target'
+                if target_stretch is None:
+                    break
+                max_cost = min(max_cost, cost * target_stretch)
+        if bounded and hops[key] >= max_legs:
+            continue
+        n1 = node_by_id.get(nid)
+        if n1 is None:
+            continue
+        for edge in node_graph.get(nid, []):
+            to = edge['to']
+            to_key = (to, hops[key] + 1) if bounded else to
+            new_cost = cost + edge['distance']
+            if to_key in done or new_cost > max_cost or new_cost >= cost_to.get(to_key, math.inf):
+                continue
+            if bounded and hops[key] + 1 >= fewest.get(to, math.inf):
+                continue
+            n2 = node_by_id.get(to)
+            if n2 is None or not edge_ok(n1, n2, edge['distance']):
+                continue
+            cost_to[to_key] = new_cost
+            prev[to_key] = key
+            hops[to_key] = hops[key] + 1
+            heappush(heap, (new_cost, to_key))
+    return {'dist': dist, 'prev': prev, 'label': label, 'legs': legs, 'settled': settled, 'status': status}
+
+def tree_path(tree: Dict, node_id) -> List:
+    path = []
+    key = tree['label'][node_id]
+    while key is not None:
+        path.append(key[0] if isinstance(key, tuple) else key)
+        key = tree['prev'][key]
+    path.reverse()
+    return path
+
+ALTERNATIVE_MAX_STRETCH = 1.4  # alternatives may be at most this much longer than the best route
+ALTERNATIVE_MAX_SHARING = 0.6  # and share at most this fraction of their length with a chosen route
+
+def search_route(origin_node, dest_node, edge_ok, deadline: Deadline, alternatives=0):
+    # Returns (list of node-id paths, best first; partial). On deadline the
+    # best plan so far is the tree path to the settled node closest to the
+    # destination: every leg of it passed edge_ok, and it stops short of the
+    # destination. The list is empty if nothing usable was found.
+    origin_id, dest_id = origin_node['id'], dest_node['id']
+    stretch = ALTERNATIVE_MAX_STRETCH if alternatives else None
+    fwd = shortest_path_tree(origin_id, edge_ok, deadline, target_id=dest_id, target_stretch=stretch)
+    print(f"[ROUTE] Search settled {len(fwd['settled'])} nodes ({fwd['status']})")
+    if fwd['status'] == 'target':
+        paths = [tree_path(fwd, dest_id)]
+        if alternatives:
+            # Backward tree from the destination; the graph is symmetric, so
+            # its paths reversed are shortest paths into the destination
+            bwd = shortest_path_tree(dest_id, edge_ok, deadline, max_cost=fwd['dist'][dest_id] * stretch)
+            paths += alternative_paths(fwd, bwd, origin_id, dest_id, alternatives)
+        return paths, False
+    if fwd['status'] == 'complete':
+        return [], False
+    best = min(fwd['settled'], key=lambda nid: haversine(node_by_id[nid]['lat'], node_by_id[nid]['lon'], dest_node['lat'], dest_node['lon']),
+               default=origin_id)
+    if best == origin_id:
+        return [], True
+    return [tree_path(fwd, best)], True
+
+def path_edges(path) -> Dict:
+    # {undirected edge: length nm} of a node-id path
+    edges = {}
+    for a, b in zip(path, path[1:]):
+        n1, n2 = node_by_id[a], node_by_id[b]
+        edges[frozenset((a, b))] = haversine(n1['lat'], n1['lon'], n2['lat'], n2['lon'])
+    return edges
+
+def alternative_paths(fwd: Dict, bwd: Dict, origin_id, dest_id, k: int,
+                      max_stretch=ALTERNATIVE_MAX_STRETCH, max_sharing=ALTERNATIVE_MAX_SHARING) -> List:
+    # Via-node alternatives from one forward and one backward shortest-path
+    # tree: every node v settled in both gives origin ~> v ~> destination at
+    # cost fwd[v] + bwd[v]. Candidates are taken cheapest first and kept when
+    # loop-free and sufficiently different from the routes already chosen.
+    best_cost = fwd['dist'][dest_id]
+    fwd_done = set(fwd['settled'])
+    candidates = []
+    for v in bwd['settled']:
+        if v in fwd_done and v not in (origin_id, dest_id):
+            cost = fwd['dist'][v] + bwd['dist'][v]
+            if cost <= best_cost * max_stretch:
+                candidates.append((cost, v))
+    candidates.sort()
+    chosen = [path_edges(tree_path(fwd, dest_id))]
+    seen = {tuple(tree_path(fwd, dest_id))}
+    paths = []
+    for cost, v in candidates:
+        if len(paths) >= k:
+            break
+        path = tree_path(fwd, v) + tree_path(bwd, v)[::-1][1:]
+        if tuple(path) in seen:
+            continue
+        seen.add(tuple(path))
+        if len(set(path)) != len(path):
+            continue
+        edges = path_edges(path)
+        length = sum(edges.values())
+        if any(sum(l for e, l in edges.items() if e in other) > max_sharing * length for other in chosen):
+            continue
+        chosen.append(edges)
+        paths.append(path)
+    return paths
+
 @app.post("/route")
-def calculate_route(req: RouteRequest):
+async def calculate_route(req: RouteRequest, request: Request):
     print("[ROUTE REQUEST]", req.dict())
     try:
         origin_info = get_airport_info(req.origin)
@@ -355,76 +745,111 @@ def calculate_route(req: RouteRequest):
     except HTTPException as exc:
         logger.error(f"[ROUTE ERROR] {exc.detail}")
         raise HTTPException(status_code=400, detail="Invalid origin or destination ICAO code.")
+    deadline = request_deadline(req.time_budget_s, ROUTE_TIME_BUDGET_S)
+    watcher = asyncio.create_task(cancel_on_disconnect(request, deadline))
+    try:
+        return await plan_route(req, origin_info, dest_info, deadline)
+    finally:
+        watcher.cancel()
+
+async def plan_route(req: RouteRequest, origin_info, dest_info, deadline: Deadline):
+    from airspace_index import cruise_band
     origin_node = closest_node(origin_info['lat'], origin_info['lon'], nodes)
     dest_node = closest_node(dest_info['lat'], dest_info['lon'], nodes)
     print(f"[ROUTE] Closest node to origin: {origin_node['id']} ({origin_node['lat']},{origin_node['lon']})")
     print(f"[ROUTE] Closest node to dest: {dest_node['id']} ({dest_node['lat']},{dest_node['lon']})")
-    max_leg = req.max_leg_distance or 150.0
-    aircraft_range = req.aircraft_range_nm or 9999
-    avoid_airspaces = req.avoid_airspaces
-    avoid_terrain = req.avoid_terrain
-    visited = set()
-    heap = []
-    heappush(heap, (0, origin_node['id'], [origin_node['id']]))
-    found = False
-    best_path = None
-    best_dist = float('inf')
-    while heap:
-        cost, nid, path = heappop(heap)
-        print(f"[DIJKSTRA] Visiting node {nid}, cost so far: {cost}, path: {path}")
-        if nid == dest_node['id']:
-            found = True
-            best_path = path
-            best_dist = cost
-            print(f"[DIJKSTRA] Destination {nid} reached, total cost: {cost}")
-            break
-        if (nid, tuple(path)) in visited:
-            continue
-        visited.add((nid, tuple(path)))
-        for edge in node_graph.get(nid, []):
-            if edge['to'] in path:
-                print(f"[DIJKSTRA] Skipping edge to {edge['to']} (cycle)")
-                continue
-            if edge['distance'] > max_leg or edge['distance'] > aircraft_range:
-                print(f"[DIJKSTRA] Skipping edge to {edge['to']} (distance {edge['distance']:.1f}nm exceeds max_leg/aircraft_range)")
-                continue
-            n1 = next((n for n in nodes if n['id'] == nid), None)
-            n2 = next((n for n in nodes if n['id'] == edge['to']), None)
-            if not n1 or not n2:
-                print(f"[DIJKSTRA] Skipping edge to {edge['to']} (node not found)")
-                continue
-            seg_penalty = 0
-            blocked = False
-            if avoid_airspaces:
-                seg = LineString([(n1['lon'], n1['lat']), (n2['lon'], n2['lat'])])
-                intersecting = airspaces_gdf[airspaces_gdf.intersects(seg)]
-                if not intersecting.empty:
-                    print(f"[DIJKSTRA] Skipping edge to {edge['to']} (blocked by airspace)")
-                    blocked = True
-            if avoid_terrain:
-                samples = get_leg_sample_points(n1['lat'], n1['lon'], n2['lat'], n2['lon'])
-                for lat, lon in samples:
-                    elev = 0  # TODO: use cached or fast elevation lookup
-                    if elev > req.altitude - 1000:
-                        print(f"[DIJKSTRA] Skipping edge to {edge['to']} (blocked by terrain at {lat},{lon})")
-                        blocked = True
-                        break
-            if blocked:
-                continue
-            print(f"[DIJKSTRA] Adding edge to {edge['to']} (distance {edge['distance']:.1f}nm)")
-            heappush(heap, (cost + edge['distance'] + seg_penalty, edge['to'], path + [edge['to']]))
-    if found and best_path:
-        print(f"[ROUTE] Graph route found: {best_path}, total distance: {best_dist:.1f}nm")
-        route_nodes = [next(n for n in nodes if n['id'] == nid) for nid in best_path]
-        route_points = [(n['lat'], n['lon']) for n in route_nodes]
-        route_names = [n['id'] for n in route_nodes]
+    edge_ok = route_edge_filter(req, origin_info, dest_info)
+    # The search is CPU-bound; keep it off the event loop
+    paths, partial = await run_in_threadpool(search_route, origin_node, dest_node, edge_ok, deadline, req.alternatives)
+    if deadline.cancelled:
+        raise HTTPException(status_code=499, detail="Client closed request.")
+    warnings = []
+    routes = []
+    unreached = None
+    if paths:
+        if partial:
+            # The plan stops at the last airport the search reached; what is
+            # left to the destination is reported, not flown
+            stop = node_by_id[paths[0][-1]]
+            remaining = haversine(stop['lat'], stop['lon'], dest_info['lat'], dest_info['lon'])
+            unreached = {
+                "from": stop['id'],
+                "from_coords": [stop['lat'], stop['lon']],
+                "to": req.destination.upper(),
+                "remaining_nm": round(remaining, 1)
+            }
+            logger.warning(f"[ROUTE WARNING] Time budget of {deadline.budget_s:.1f}s exhausted, returning best partial route")
+            warnings.append(f"Route search hit its time budget; the route stops at {stop['id']}, "
+                            f"{remaining:.0f} nm short of the destination.")
+        print(f"[ROUTE] Graph route found: {paths[0]}")
+        for path in paths:
+            route_nodes = [node_by_id[nid] for nid in path]
+            routes.append(([(n['lat'], n['lon']) for n in route_nodes], [n['id'] for n in route_nodes]))
+    elif partial:
+        raise HTTPException(status_code=504, detail=f"Route search exceeded its time budget of {deadline.budget_s:.1f}s.")
     else:
         logger.warning("[ROUTE WARNING] No graph route found, using direct route.")
-        route_points = [(origin_info['lat'], origin_info['lon']), (dest_info['lat'], dest_info['lon'])]
-        route_names = [req.origin.upper(), req.destination.upper()]
-    # (Keep old code for VFR altitude, segments, etc.)
-    legs = [(route_points[i], route_points[i+1]) for i in range(len(route_points) - 1)]
-    vfr_alts = asyncio.run(get_all_leg_vfr_altitudes(legs))
+        routes.append(([(origin_info['lat'], origin_info['lon']), (dest_info['lat'], dest_info['lon'])],
+                       [req.origin.upper(), req.destination.upper()]))
+    if req.avoid_airspaces:
+        band = cruise_band(req.altitude)
+        # Detour planning is CPU-bound as well and shares the request's budget
+        routes = await run_in_threadpool(
+            lambda: [avoid_airspaces(points, names, band, deadline) for points, names in routes])
+        if deadline.cancelled:
+            raise HTTPException(status_code=499, detail="Client closed request.")
+        if deadline.expired():
+            logger.warning(f"[ROUTE WARNING] Time budget of {deadline.budget_s:.1f}s exhausted during airspace avoidance")
+            warnings.append("Airspace detours were not all planned within the time budget; some legs may cross airspace.")
+            partial = True
+    # One terrain fetch for the legs of every route; alternatives share most samples
+    route_legs = [[(points[i], points[i+1]) for i in range(len(points) - 1)] for points, _ in routes]
+    all_legs = [leg for legs in route_legs for leg in legs]
+    # Fetches stop at the deadline rather than being cancelled mid-flight
+    vfr_alts, blocked, terrain = await get_all_leg_vfr_altitudes(all_legs, fetch_terrain=deadline.remaining() > 0, deadline=deadline)
+    if deadline.cancelled:
+        raise HTTPException(status_code=499, detail="Client closed request.")
+    if deadline.expired():
+        warnings.append("Terrain elevations were not all fetched within the time budget; VFR altitudes may ignore terrain.")
+        partial = True
+    # Legs of the main route no VFR altitude clears; every route flags them per segment
+    stuck = [f"{routes[0][1][i]}-{routes[0][1][i+1]}" for i in blocked if i < len(route_legs[0])]
+    if stuck:
+        warnings.append(f"No altitude up to {MAX_VFR_ALTITUDE} ft clears the airspace on leg(s) {', '.join(stuck)}; "
+                        f"the VFR altitude shown there still conflicts.")
+    summaries = []
+    offset = 0
+    for (points, names), legs in zip(routes, route_legs):
+        conflicts = {i - offset for i in blocked if offset <= i < offset + len(legs)}
+        ground_ft = route_ground_ft(names, terrain[offset:offset + len(legs)])
+        summaries.append(route_summary(req, points, names, legs, vfr_alts[offset:offset + len(legs)], ground_ft, conflicts))
+        offset += len(legs)
+    result = summaries[0]
+    result.update({
+        "origin_coords": [origin_info['lat'], origin_info['lon']],
+        "destination_coords": [dest_info['lat'], dest_info['lon']],
+        "partial": partial,
+        "unreached": unreached,
+        "warnings": warnings
+    })
+    if req.alternatives:
+        result["alternatives"] = summaries[1:]
+    return FastJSONResponse(result)
+
+def route_ground_ft(route_names, leg_terrain) -> float:
+    # Highest known ground under a route: the field elevation of every airport
+    # on it and the terrain sampled along its legs
+    ground = list(leg_terrain)
+    for code in route_names:
+        row = code_to_row.get(str(code).upper())
+        try:
+            ground.append(float(row['elevation_ft']))
+        except (TypeError, KeyError, ValueError):
+            continue
+    return max(ground, default=0.0)
+
+def route_summary(req: RouteRequest, route_points, route_names, legs, vfr_alts, ground_ft=0.0, conflicts=()) -> Dict:
+    from corridor import glide_radius_nm
     segments = []
     for i, ((start, end), vfr_alt) in enumerate(zip(legs, vfr_alts)):
         seg_type = 'cruise'
@@ -433,10 +858,11 @@ def calculate_route(req: RouteRequest):
         elif i == len(legs) - 1:
             seg_type = 'descent'
         segments.append({
-            'start': start,
-            'end': end,
+            'start': trim_coords(start),
+            'end': trim_coords(end),
             'type': seg_type,
-            'vfr_altitude': vfr_alt
+            'vfr_altitude': vfr_alt,
+            'airspace_conflict': i in conflicts
         })
     total_dist = 0
     for i in range(len(route_points) - 1):
@@ -445,14 +871,136 @@ def calculate_route(req: RouteRequest):
     if req.speed_unit == 'mph':
         speed = speed * 0.868976
     total_time = total_dist / speed if speed else 0
+    # Airports the route lands on or passes over between origin and destination
+    overflown = [(names, point) for names, point in zip(route_names[1:-1], route_points[1:-1]) if names != 'DETOUR']
+    overflown_airports = [code for code, _ in overflown]
+    # Gliding distance depends on height above the ground, not on altitude MSL
+    radius = req.corridor_nm if req.corridor_nm is not None else glide_radius_nm(req.altitude - ground_ft, req.glide_ratio)
+    corridor = corridor_index.query(route_points, radius, exclude=(route_names[0], route_names[-1]))
+    corridor_names = {a['icao']: a['name'] for a in corridor}
     return {
         "route": route_names,
         "distance_nm": round(total_dist, 1),
         "time_hr": round(total_time, 2),
+        "segments": segments,
+        "overflown_airports": overflown_airports,
+        "overflown_coords": [trim_coords(point) for _, point in overflown],
+        "overflown_names": [corridor_names.get(code) or get_airport_name(code) for code in overflown_airports],
+        "corridor_nm": round(radius, 1),
+        "corridor_ground_ft": round(ground_ft),
+        "corridor_airports": corridor
+    }
+
+def get_airport_name(code):
+    row = code_to_row.get(str(code).upper())
+    return row.get('name', code) if row else code
+
+class ReachableRequest(FlightConstraints):
+    origin: str
+    avoid_airspaces: bool = False
+    avoid_terrain: bool = False
+    max_hours: Optional[float] = Field(None, gt=0)
+    max_distance_nm: Optional[float] = Field(None, gt=0)
+    max_legs: Optional[int] = Field(None, ge=1)
+    include_isochrone: bool = False
+    stream: bool = False  # NDJSON: a header line, one line per airport, then a summary line
+
+ISOCHRONE_SIMPLIFY_NM = 5.0
+
+def reachability_isochrone(origin_info, reached, max_cost, max_leg):
+    # Union of discs around every reached node with the distance still left
+    # to fly (never more than one leg, max_leg). Built in a local equirectangular
+    # plane in nm around the origin, simplified, then returned as GeoJSON.
+    import shapely
+    from shapely.geometry import mapping
+    lat0 = math.radians(origin_info['lat'])
+    kx = 60.0 * math.cos(lat0)
+    discs = []
+    for n, cost in reached:
+        radius = min(max_cost - cost, max_leg)
+        if radius > 0:
+            discs.append(shapely.Point(n['lon'] * kx, n['lat'] * 60.0).buffer(radius, quad_segs=8))
+    if not discs:
+        return None
+    area = shapely.union_all(discs).simplify(ISOCHRONE_SIMPLIFY_NM, preserve_topology=True)
+    area = shapely.transform(area, lambda xy: xy / [kx, 60.0])
+    geom = mapping(area)
+    return dict(geom, coordinates=trim_coords(geom['coordinates']))
+
+def reachable_airports(req: ReachableRequest, origin_info, deadline: Deadline):
+    # One bounded Dijkstra from the origin's graph node; every settled node has its final cost
+    speed_kt = req.speed * 0.868976 if req.speed_unit == 'mph' else req.speed
+    max_cost = math.inf
+    if req.max_distance_nm:
+        max_cost = req.max_distance_nm
+    if req.max_hours and speed_kt:
+        max_cost = min(max_cost, req.max_hours * speed_kt)
+    origin_node = closest_node(origin_info['lat'], origin_info['lon'], nodes)
+    edge_ok = route_edge_filter(req, origin_info, origin_info)
+    tree = shortest_path_tree(origin_node['id'], edge_ok, deadline, max_cost=max_cost, max_legs=req.max_legs)
+    print(f"[REACHABLE] Settled {len(tree['settled'])} nodes from {origin_node['id']} within {max_cost:.0f}nm ({tree['status']})")
+    airports = []
+    reached = []
+    for nid in tree['settled']:
+        n = node_by_id[nid]
+        cost = tree['dist'][nid]
+        reached.append((n, cost))
+        if nid == origin_node['id'] or n.get('type') != 'airport':
+            continue
+        airports.append({
+            'icao': nid,
+            'name': n.get('name', ''),
+            'lat': n['lat'],
+            'lon': n['lon'],
+            'distance_nm': round(cost, 1),
+            'time_hr': round(cost / speed_kt, 2) if speed_kt else None,
+            'legs': tree['legs'][nid]
+        })
+    # A disc can't reach further than one edge of the graph could
+    max_leg = min(req.max_leg_distance or 150.0, req.aircraft_range_nm or math.inf)
+    isochrone = reachability_isochrone(origin_info, reached, max_cost, max_leg) if req.include_isochrone else None
+    return origin_node, max_cost, airports, isochrone, tree['status'] in ('deadline', 'cancelled')
+
+@app.post("/reachable")
+async def get_reachable(req: ReachableRequest, request: Request):
+    # Every airport reachable from the origin within max_hours and/or
+    # max_distance_nm under the same leg and avoidance rules as /route
+    try:
+        origin_info = get_airport_info(req.origin)
+    except HTTPException as exc:
+        logger.error(f"[REACHABLE ERROR] {exc.detail}")
+        raise HTTPException(status_code=400, detail="Invalid origin ICAO code.")
+    if not req.max_hours and not req.max_distance_nm:
+        raise HTTPException(status_code=400, detail="Specify max_hours or max_distance_nm.")
+    deadline = request_deadline(req.time_budget_s, ROUTE_TIME_BUDGET_S)
+    watcher = asyncio.create_task(cancel_on_disconnect(request, deadline))
+    try:
+        origin_node, max_cost, airports, isochrone, partial = await run_in_threadpool(reachable_airports, req, origin_info, deadline)
+    finally:
+        watcher.cancel()
+    if deadline.cancelled:
+        raise HTTPException(status_code=499, detail="Client closed request.")
+    header = {
+        "origin": req.origin.upper(),
+        "origin_node": origin_node['id'],
         "origin_coords": [origin_info['lat'], origin_info['lon']],
-        "destination_coords": [dest_info['lat'], dest_info['lon']],
-        "segments": segments
+        "max_distance_nm": round(max_cost, 1),
+        "partial": partial
     }
+    if req.stream:
+        def lines():
+            yield dumps(header) + b"\n"
+            for airport in airports:
+                yield dumps(airport) + b"\n"
+            summary = {"count": len(airports)}
+            if req.include_isochrone:
+                summary["isochrone"] = isochrone
+            yield dumps(summary) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    result = dict(header, count=len(airports), airports=airports)
+    if req.include_isochrone:
+        result["isochrone"] = isochrone
+    return FastJSONResponse(result)
 
 def haversine(lat1, lon1, lat2, lon2):
     R = 3440.065  # Radius of earth in nautical miles
@@ -465,7 +1013,8 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * c
 
 @app.get("/weather")
-def get_weather(origin: str, destination: str):
+async def get_weather(request: Request, origin: str, destination: str, time_budget_s: Optional[float] = Query(None, gt=0),
+                      compact: bool = False):
     try:
         origin_info = get_airport_info(origin)
         dest_info = get_airport_info(destination)
@@ -474,42 +1023,60 @@ def get_weather(origin: str, destination: str):
         raise HTTPException(status_code=400, detail="Invalid origin or destination ICAO code.")
     if not OPENWEATHERMAP_API_KEY:
         raise HTTPException(status_code=503, detail="OpenWeatherMap API key not set.")
-    def fetch_weather(lat, lon):
+    deadline = request_deadline(time_budget_s, WEATHER_TIME_BUDGET_S)
+
+    async def fetch_weather(client, lat, lon):
         url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHERMAP_API_KEY}&units=metric"
-        resp = requests.get(url)
-        if resp.status_code == 200:
-            return resp.json()
+        try:
+            resp = await client.get(url)
+            if resp.status_code == 200:
+                return resp.json()
+        except httpx.HTTPError:
+            pass
         logger.error(f"[WEATHER ERROR] Failed to fetch weather for {lat},{lon}")
         return {"error": f"Failed to fetch weather for {lat},{lon}"}
-    origin_weather = fetch_weather(origin_info['lat'], origin_info['lon'])
-    dest_weather = fetch_weather(dest_info['lat'], dest_info['lon'])
 
     # Wind barbs along route (every 20nm)
     lat1, lon1 = origin_info['lat'], origin_info['lon']
     lat2, lon2 = dest_info['lat'], dest_info['lon']
     total_dist = haversine(lat1, lon1, lat2, lon2)
     n_points = max(2, int(total_dist // 20) + 1)
+    points = [(lat1 + i / (n_points - 1) * (lat2 - lat1), lon1 + i / (n_points - 1) * (lon2 - lon1)) for i in range(n_points)]
+
+    # All points are fetched concurrently; whatever is still outstanding when
+    # the budget runs out is dropped and the response is marked partial
+    watcher = asyncio.create_task(cancel_on_disconnect(request, deadline))
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            coros = [fetch_weather(client, lat1, lon1), fetch_weather(client, lat2, lon2)]
+            coros += [fetch_weather(client, lat, lon) for lat, lon in points]
+            results, complete = await gather_within(coros, deadline, default={"error": "Weather fetch timed out"})
+    finally:
+        watcher.cancel()
+    if not complete:
+        logger.warning(f"[WEATHER WARNING] Time budget of {deadline.budget_s:.1f}s exhausted, returning partial weather")
+    origin_weather, dest_weather = results[0], results[1]
+    if compact:
+        # Only the fields the planner displays instead of the raw upstream payloads
+        origin_weather, dest_weather = compact_weather(origin_weather), compact_weather(dest_weather)
     wind_points = []
-    for i in range(n_points):
-        frac = i / (n_points - 1)
-        lat = lat1 + frac * (lat2 - lat1)
-        lon = lon1 + frac * (lon2 - lon1)
-        wx = fetch_weather(lat, lon)
+    for (lat, lon), wx in zip(points, results[2:]):
         wind = wx.get('wind', {})
         wind_points.append({
-            'lat': lat,
-            'lon': lon,
+            'lat': round(lat, 5),
+            'lon': round(lon, 5),
             'wind_speed': wind.get('speed'),
             'wind_deg': wind.get('deg')
         })
 
-    return {
+    return FastJSONResponse({
         "origin": origin,
         "destination": destination,
         "origin_weather": origin_weather,
         "destination_weather": dest_weather,
-        "wind_points": wind_points
-    }
+        "wind_points": wind_points,
+        "partial": not complete
+    })
 
 @app.get("/airspaces")
 def get_airspaces(
@@ -518,112 +1085,187 @@ def get_airspaces(
     max_lat: float = Query(...),
     max_lon: float = Query(...)
 ):
-    bbox = (min_lon, min_lat, max_lon, max_lat)
-    filtered = airspaces_gdf.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
-    return JSONResponse(content=filtered.to_json())
+    from shapely.geometry import box
+    # Airspaces whose bounding box meets the view; bodies were encoded at load time
+    hits = sorted(airspace_index.tree.query(box(min_lon, min_lat, max_lon, max_lat)).tolist())
+    return Response(content=feature_collection(airspace_features[i] for i in hits), media_type="application/json")
+
+@app.get("/elevation-cache/stats")
+def elevation_cache_stats():
+    return elevation_cache.snapshot()
 
 @app.post("/terrain-profile")
 async def terrain_profile(request: Request):
     data = await request.json()
     points = data.get('points', [])  # list of [lat, lon]
-    elevations = []
-    async with httpx.AsyncClient() as client:
-        for lat, lon in points:
-            # OpenTopography SRTM API (public, no key needed for demo)
-            url = f"https://portal.opentopography.org/API/globaldem?demtype=SRTMGL1&south={lat}&north={lat}&west={lon}&east={lon}&outputFormat=JSON"
-            try:
-                resp = await client.get(url, timeout=5)
-                if resp.status_code == 200:
-                    j = resp.json()
-                    elev = j['data'][0][2] if 'data' in j and j['data'] else None
-                else:
-                    elev = None
-            except Exception:
-                elev = None
-            elevations.append({'lat': lat, 'lon': lon, 'elevation': elev})
-    return elevations
+    async with elevation_client() as client:
+        found = await fetch_elevation_batch([(lat, lon) for lat, lon in points], client, default=None)
+    return [{'lat': lat, 'lon': lon, 'elevation': found[(round(lat, 5), round(lon, 5))]} for lat, lon in points]
 
-# Load waypoints.csv
-waypoints = []
-waypoints_path = os.path.join(os.path.dirname(__file__), 'waypoints.csv')
-if os.path.exists(waypoints_path):
-    with open(waypoints_path) as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            waypoints.append(row)
-else:
-    print('[WARN] waypoints.csv not found; only airports will be used as nodes.')
+MAX_PROFILE_SAMPLES = 2000
 
-# Extract airports, navaids, intersections, waypoints from airports_us.json
-nodes = []
-num_airports = 0
-num_navaids = 0
-num_intersections = 0
-num_waypoints = 0
-for row in json_airports:
-    type_str = str(row.get('type', '')).lower()
-    # Airports
-    if type_str == 'airport' or row.get('icaoCode') or row.get('gpsCode'):
-        try:
-            coords = row.get('geometry', {}).get('coordinates')
-            if coords and len(coords) == 2:
-                lat, lon = coords[1], coords[0]
-                nodes.append({'id': row.get('icaoCode') or row.get('gpsCode') or row.get('localCode') or row.get('id'),
-                              'name': row.get('name', ''), 'lat': lat, 'lon': lon, 'type': 'airport'})
-                num_airports += 1
-        except Exception:
-            continue
-    # Navaids
-    elif type_str in ['navaid', 'vor', 'ndb', 'dme']:
-        try:
-            coords = row.get('geometry', {}).get('coordinates')
-            if coords and len(coords) == 2:
-                lat, lon = coords[1], coords[0]
-                nodes.append({'id': row.get('id'), 'name': row.get('name', ''), 'lat': lat, 'lon': lon, 'type': type_str})
-                num_navaids += 1
-        except Exception:
-            continue
-    # Intersections/Waypoints
-    elif type_str in ['intersection', 'waypoint', 'reportingpoint']:
-        try:
-            coords = row.get('geometry', {}).get('coordinates')
-            if coords and len(coords) == 2:
-                lat, lon = coords[1], coords[0]
-                nodes.append({'id': row.get('id'), 'name': row.get('name', ''), 'lat': lat, 'lon': lon, 'type': type_str})
-                if type_str == 'intersection':
-                    num_intersections += 1
-                else:
-                    num_waypoints += 1
-        except Exception:
-            continue
+class RouteProfileRequest(BaseModel):
+    route: List[Tuple[float, float]]  # [[lat, lon], ...] for the whole route
+    spacing_nm: float = Field(1.0, gt=0)
+    include_leg_max: bool = True
+    encoding: str = 'json'  # 'json' or 'float32'
+    time_budget_s: Optional[float] = None  # seconds; server default when omitted
+
+@app.post("/terrain-profile/route")
+async def route_terrain_profile(req: RouteProfileRequest):
+    if req.encoding not in ('json', 'float32'):
+        raise HTTPException(status_code=400, detail="encoding must be 'json' or 'float32'.")
+    if len(req.route) < 2:
+        raise HTTPException(status_code=400, detail="route needs at least two points.")
+    legs = list(zip(req.route[:-1], req.route[1:]))
+    total = sum(haversine(a[0], a[1], b[0], b[1]) for a, b in legs)
+    # Widen the spacing if the requested one would exceed the sample budget
+    spacing = max(req.spacing_nm, total / MAX_PROFILE_SAMPLES)
+    samples = []  # (lat, lon, distance along route)
+    leg_offsets = []
+    along = 0.0
+    for i, ((lat1, lon1), (lat2, lon2)) in enumerate(legs):
+        pts = great_circle_points(lat1, lon1, lat2, lon2, spacing)
+        # Each leg shares its first point with the previous leg's last point
+        leg_offsets.append(max(0, len(samples) - 1))
+        for lat, lon, d in (pts if i == 0 else pts[1:]):
+            samples.append((lat, lon, along + d))
+        along += pts[-1][2]
+    keys = [(round(lat, 5), round(lon, 5)) for lat, lon, _ in samples]
+    deadline = request_deadline(req.time_budget_s, ROUTE_TIME_BUDGET_S)
+    async with elevation_client() as client:
+        elevations = await fetch_elevation_batch(list(set(keys)), client, default=None, deadline=deadline)
+    # Samples still missing when the budget ran out stay null (NaN in float32)
+    partial = deadline.expired() and any(elevations.get(k) is None for k in keys)
+    distance = [round(d, 3) for _, _, d in samples]
+    elevation = [elevations.get(k) for k in keys]
+    leg_bounds = list(zip(leg_offsets, leg_offsets[1:] + [len(samples) - 1]))
+    leg_max = [max((e for e in elevation[lo:hi + 1] if e is not None), default=None) for lo, hi in leg_bounds]
+    if req.encoding == 'float32':
+        # Little-endian float32: all distances followed by all elevations (NaN = unknown)
+        body = array('f', distance)
+        body.extend(float('nan') if e is None else e for e in elevation)
+        if sys.byteorder != 'little':
+            body.byteswap()
+        headers = {
+            "X-Profile-Samples": str(len(samples)),
+            "X-Profile-Spacing-Nm": f"{spacing:.3f}",
+            "X-Profile-Leg-Offsets": ",".join(str(o) for o in leg_offsets),
+            "X-Profile-Partial": "true" if partial else "false",
+        }
+        if req.include_leg_max:
+            headers["X-Profile-Leg-Max"] = ",".join("" if m is None else f"{m:g}" for m in leg_max)
+        return Response(content=body.tobytes(), media_type="application/octet-stream", headers=headers)
+    result = {
+        "spacing_nm": round(spacing, 3),
+        "total_distance_nm": round(along, 3),
+        "leg_offsets": leg_offsets,
+        "distance_nm": distance,
+        "elevation": elevation,
+        "partial": partial,
+    }
+    if req.include_leg_max:
+        result["leg_max_elevation"] = leg_max
+    return FastJSONResponse(result)
 
 # Build adjacency list graph: connect nodes within 200nm
 GRAPH_MAX_DIST_NM = 200
-node_graph = {n['id']: [] for n in nodes}
-for i, n1 in enumerate(nodes):
-    for j, n2 in enumerate(nodes):
-        if i == j:
-            continue
-        dist = haversine(n1['lat'], n1['lon'], n2['lat'], n2['lon'])
-        if dist <= GRAPH_MAX_DIST_NM:
-            node_graph[n1['id']].append({'to': n2['id'], 'distance': dist})
-
-print(f'[GRAPH] Loaded {len(nodes)} nodes: {num_airports} airports, {num_navaids} navaids, {num_intersections} intersections, {num_waypoints} waypoints')
-
-# Function to generate a detour point just outside an obstacle (airspace or terrain)
-def generate_detour_point(lat1, lon1, lat2, lon2, obstacle_shape, buffer_nm=5.0):
-    # Find midpoint of segment
-    mid_lat = (lat1 + lat2) / 2
-    mid_lon = (lon1 + lon2) / 2
-    # Find closest point on obstacle boundary to midpoint
-    from shapely.geometry import Point
-    mid_point = Point(mid_lon, mid_lat)
-    boundary = obstacle_shape.boundary
-    closest = boundary.interpolate(boundary.project(mid_point))
-    # Offset detour by buffer_nm (approx 0.0167 deg per nm)
-    offset_lat = closest.y + buffer_nm * 0.0167
-    offset_lon = closest.x + buffer_nm * 0.0167
-    return (offset_lat, offset_lon)
+
+def build_graph(progress_base=0.0, progress_weight=0.0):
+    global waypoints, nodes, node_graph, node_by_id
+    # Load waypoints.csv
+    waypoint_rows = []
+    waypoints_path = os.path.join(os.path.dirname(__file__), 'waypoints.csv')
+    if os.path.exists(waypoints_path):
+        with open(waypoints_path) as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                waypoint_rows.append(row)
+    else:
+        print('[WARN] waypoints.csv not found; only airports will be used as nodes.')
+
+    # Extract airports, navaids, intersections, waypoints from airports_us.json
+    graph_nodes = []
+    num_airports = 0
+    num_navaids = 0
+    num_intersections = 0
+    num_waypoints = 0
+    for row in json_airports:
+        type_str = str(row.get('type', '')).lower()
+        # Airports
+        if type_str == 'airport' or row.get('icaoCode') or row.get('gpsCode'):
+            try:
+                coords = row.get('geometry', {}).get('coordinates')
+                if coords and len(coords) == 2:
+                    lat, lon = coords[1], coords[0]
+                    graph_nodes.append({'id': row.get('icaoCode') or row.get('gpsCode') or row.get('localCode') or row.get('id'),
+                                        'name': row.get('name', ''), 'lat': lat, 'lon': lon, 'type': 'airport'})
+                    num_airports += 1
+            except Exception:
+                continue
+        # Navaids
+        elif type_str in ['navaid', 'vor', 'ndb', 'dme']:
+            try:
+                coords = row.get('geometry', {}).get('coordinates')
+                if coords and len(coords) == 2:
+                    lat, lon = coords[1], coords[0]
+                    graph_nodes.append({'id': row.get('id'), 'name': row.get('name', ''), 'lat': lat, 'lon': lon, 'type': type_str})
+                    num_navaids += 1
+            except Exception:
+                continue
+        # Intersections/Waypoints
+        elif type_str in ['intersection', 'waypoint', 'reportingpoint']:
+            try:
+                coords = row.get('geometry', {}).get('coordinates')
+                if coords and len(coords) == 2:
+                    lat, lon = coords[1], coords[0]
+                    graph_nodes.append({'id': row.get('id'), 'name': row.get('name', ''), 'lat': lat, 'lon': lon, 'type': type_str})
+                    if type_str == 'intersection':
+                        num_intersections += 1
+                    else:
+                        num_waypoints += 1
+            except Exception:
+                continue
+
+    graph = {n['id']: [] for n in graph_nodes}
+    for i, n1 in enumerate(graph_nodes):
+        startup_state['progress'] = round(progress_base + progress_weight * i / len(graph_nodes), 3)
+        for j, n2 in enumerate(graph_nodes):
+            if i == j:
+                continue
+            dist = haversine(n1['lat'], n1['lon'], n2['lat'], n2['lon'])
+            if dist <= GRAPH_MAX_DIST_NM:
+                graph[n1['id']].append({'to': n2['id'], 'distance': dist})
+
+    print(f'[GRAPH] Loaded {len(graph_nodes)} nodes: {num_airports} airports, {num_navaids} navaids, {num_intersections} intersections, {num_waypoints} waypoints')
+    waypoints, nodes, node_graph = waypoint_rows, graph_nodes, graph
+    node_by_id = {n['id']: n for n in graph_nodes}
+
+# Loading stages with their share of the reported progress
+STARTUP_STAGES = [('airports', 0.2), ('airspaces', 0.3), ('graph', 0.5)]
+
+def load_all():
+    started = time.monotonic()
+    startup_state['status'] = 'loading'
+    try:
+        done = 0.0
+        for stage, weight in STARTUP_STAGES:
+            startup_state['stage'] = stage
+            startup_state['progress'] = round(done, 3)
+            if stage == 'airports':
+                load_airports()
+            elif stage == 'airspaces':
+                load_airspaces()
+            else:
+                build_graph(done, weight)
+            done += weight
+    except Exception as exc:
+        logger.error(f"[STARTUP] Loading failed during {startup_state['stage']}: {exc}")
+        startup_state['status'] = 'failed'
+        startup_state['error'] = str(exc)
+        raise
+    startup_state.update(status='ready', stage=None, progress=1.0, load_seconds=round(time.monotonic() - started, 1))
+    print(f"[STARTUP] Data ready in {startup_state['load_seconds']}s")
 
 # --- GLOBAL ERROR HANDLER ---
 @app.exception_handler(HTTPException)
@@ -664,4 +1306,7 @@ async def generic_exception_handler(request: Request, exc: Exception):
                 "message": "An unexpected error occurred. Please try again later."
             }
         },
-    ) 
\ No newline at end of file
+    ) 
+
+if STARTUP_MODE != 'background':
+    load_all()
@@ -0,0 +1,81 @@
+import json
+from typing import Any, Dict, Iterable, List
+
+from fastapi.responses import JSONResponse
+
+# Response encoding helpers.
+#
+# FastJSONResponse renders with orjson when it is installed (several times
+# faster than the stdlib encoder, and it handles numpy values natively) and
+# falls back to json otherwise. Endpoints that return it directly also skip
+# FastAPI's generic jsonable_encoder pass. Static data such as airspace
+# features is encoded once at load time and served by joining the cached bytes.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+# 5 decimal places is about 1 m, well below anything drawn on a sectional
+COORD_PRECISION = 5
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def _default(value):
+    # numpy scalars and arrays for the stdlib fallback
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def trim_coords(value, ndigits: int = COORD_PRECISION):
+    # Round every float in a (possibly nested) coordinate list/tuple
+    if isinstance(value, float):
+        return round(value, ndigits)
+    if isinstance(value, (list, tuple)):
+        return [trim_coords(v, ndigits) for v in value]
+    return value
+
+
+def encode_feature(geometry: Dict, properties: Dict, ndigits: int = COORD_PRECISION) -> bytes:
+    # One GeoJSON Feature, coordinates trimmed, ready to be joined into a collection
+    geometry = dict(geometry, coordinates=trim_coords(geometry['coordinates'], ndigits))
+    return dumps({'type': 'Feature', 'geometry': geometry, 'properties': properties})
+
+
+def feature_collection(encoded: Iterable[bytes]) -> bytes:
+    return b'{"type":"FeatureCollection","features":[' + b','.join(encoded) + b']}'
+
+
+def compact_weather(wx: Dict) -> Dict:
+    # The subset of an OpenWeatherMap current-weather payload the planner uses
+    if not isinstance(wx, dict) or 'error' in wx:
+        return wx
+    out: Dict[str, Any] = {}
+    if wx.get('name'):
+        out['name'] = wx['name']
+    weather: List[Dict] = wx.get('weather') or []
+    if weather:
+        out['weather'] = [{'main': w.get('main'), 'description': w.get('description')} for w in weather[:1]]
+    main = wx.get('main') or {}
+    if main:
+        out['main'] = {k: main[k] for k in ('temp', 'pressure', 'humidity') if k in main}
+    wind = wx.get('wind') or {}
+    if wind:
+        out['wind'] = {k: wind[k] for k in ('speed', 'deg', 'gust') if k in wind}
+    if 'visibility' in wx:
+        out['visibility'] = wx['visibility']
+    clouds = wx.get('clouds') or {}
+    if 'all' in clouds:
+        out['clouds'] = {'all': clouds['all']}
+    return out
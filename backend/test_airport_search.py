@@ -0,0 +1,47 @@
+from airport_search import AirportSearchIndex, compact_result
+
+ROWS = [
+    {"ident": "KJFK", "icao_code": "KJFK", "local_code": "JFK", "name": "John F Kennedy International Airport",
+     "type": "large_airport", "latitude_deg": "40.6398", "longitude_deg": "-73.7789", "municipality": "New York"},
+    {"ident": "KBOS", "icao_code": "KBOS", "local_code": "BOS", "name": "General Edward Lawrence Logan International Airport",
+     "type": "large_airport", "latitude_deg": "42.3643", "longitude_deg": "-71.0052", "municipality": "Boston"},
+    {"ident": "KJFX", "local_code": "JFX", "name": "Walker County Airport",
+     "type": "small_airport", "latitude_deg": "33.9", "longitude_deg": "-87.3"},
+    {"ident": "NY99", "name": "Kennedy Heliport", "type": "heliport", "latitude_deg": "40.7", "longitude_deg": "-74.0"},
+    {"ident": "XXXX", "name": "No Coordinates", "type": "small_airport", "latitude_deg": "", "longitude_deg": ""},
+]
+
+index = AirportSearchIndex(ROWS)
+
+
+def codes(results):
+    return [a[0] for a in results]
+
+def test_prefix_ranked_by_type():
+    assert codes(index.search("KJF")) == ["KJFK", "KJFX"]
+
+def test_name_token_and_multi_word():
+    assert codes(index.search("kennedy")) == ["KJFK", "NY99"]
+    assert codes(index.search("kennedy heli")) == ["NY99"]
+    assert codes(index.search("logan")) == ["KBOS"]
+
+def test_local_code_exact_match_first():
+    assert codes(index.search("JFX"))[0] == "KJFX"
+
+def test_limit_and_empty_queries():
+    assert len(index.search("K", limit=1)) == 1
+    assert index.search("") == []
+    assert index.search("QQQ") == []
+    assert len(index) == 4
+
+def test_compact_result():
+    a = compact_result(index.search("KBOS")[0])
+    assert a["icao"] == "KBOS"
+    assert a["city"] == "Boston"
+    assert (a["lat"], a["lon"]) == (42.3643, -71.0052)
+
+def test_multi_word_any_order_and_codes():
+    assert codes(index.search("heli kennedy")) == ["NY99"]
+    assert codes(index.search("international k")) == ["KJFK", "KBOS"]
+    assert codes(index.search("jfk john")) == ["KJFK"]
+    assert index.search("kennedy logan") == []
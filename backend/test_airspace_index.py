@@ -0,0 +1,80 @@
+from shapely.geometry import Point, box
+from airspace_index import (AirspaceIndex, MAX_TERRAIN_FT, UNLIMITED_FT, cruise_band, ground_estimates_ft,
+                            is_vfr_transparent, parse_limit_ft)
+
+# Class B surface area, a shelf with a 7,000 ft floor, Class E from 1,200 AGL
+# and a restricted area that happens to be tagged class G
+SURFACE = Point(-122.375, 37.62).buffer(0.1)
+SHELF = Point(-122.375, 37.62).buffer(0.35)
+CLASS_E = box(-125, 35, -120, 40)
+RESTRICTED = box(-122.0, 37.3, -121.9, 37.9)
+FEATURES = [
+    {"geometry": SURFACE, "lower_ft": 0.0, "upper_ft": 10000.0, "icao_class": 1, "type": 0},
+    {"geometry": SHELF, "lower_ft": 7000.0, "upper_ft": 10000.0, "icao_class": 1, "type": 0},
+    {"geometry": CLASS_E, "lower_ft": 1200.0, "upper_ft": 18000.0, "icao_class": 4, "type": 0},
+    {"geometry": RESTRICTED, "lower_ft": 0.0, "upper_ft": 5000.0, "icao_class": 6, "type": 1},
+]
+index = AirspaceIndex.from_features(FEATURES)
+
+
+def test_parse_limits():
+    assert parse_limit_ft({"value": 7000, "unit": 1, "referenceDatum": 1}, 0) == 7000
+    assert parse_limit_ft({"value": 180, "unit": 6, "referenceDatum": 2}, 0) == 18000
+    assert round(parse_limit_ft({"value": 1000, "unit": 0, "referenceDatum": 1}, 0)) == 3281
+    assert parse_limit_ft("FL 95", 0) == 9500
+    assert parse_limit_ft("1200ft AGL", 0) == 1200
+    assert parse_limit_ft("SFC", 500) == 0
+    assert parse_limit_ft("UNL", 0) == UNLIMITED_FT
+    assert parse_limit_ft(None, 42) == 42
+    assert parse_limit_ft("garbage", 42) == 42
+
+def test_agl_ceilings_allow_for_terrain():
+    # SFC-2,500 AGL over a 5,000 ft field must not top out at 2,500 MSL
+    upper = {"value": 2500, "unit": 1, "referenceDatum": 0}
+    assert parse_limit_ft(upper, UNLIMITED_FT, ground_ft=5000) == 7500
+    assert parse_limit_ft("2500 FT AGL", UNLIMITED_FT, ground_ft=5000) == 7500
+    # Floors stay at their sea-level reading, MSL limits are untouched
+    assert parse_limit_ft(upper, 0) == 2500
+    assert parse_limit_ft({"value": 2500, "unit": 1, "referenceDatum": 1}, 0, ground_ft=MAX_TERRAIN_FT) == 2500
+    assert parse_limit_ft({"value": 95, "unit": 6, "referenceDatum": 2}, 0, ground_ft=MAX_TERRAIN_FT) == 9500
+
+def test_ground_estimates_from_nearby_airports():
+    # A high field inside the first area, a sea-level one near the second,
+    # nothing anywhere near the third
+    areas = [box(-106, 39, -105, 40), box(-80.5, 25.5, -80.2, 25.8), box(-150, 10, -149.9, 10.1)]
+    lats, lons, elevs = [39.5, 39.6, 25.9], [-105.5, -105.4, -80.3], [5400, 6200, 8]
+    ground = ground_estimates_ft(areas, lats, lons, elevs)
+    assert ground.tolist() == [6200, 8, MAX_TERRAIN_FT]
+    # Nothing near: far-away airports do not count
+    assert ground_estimates_ft(areas[1:2], [39.5], [-105.5], [5400]).tolist() == [MAX_TERRAIN_FT]
+
+def test_transparency():
+    assert is_vfr_transparent(4, 0)
+    assert not is_vfr_transparent(1, 0)
+    assert not is_vfr_transparent(6, 1)
+    assert is_vfr_transparent(8, 10)
+
+def test_flight_under_shelf_is_clear():
+    # Crosses the shelf but not the surface area, at 5,500 ft
+    assert list(index.conflicts(37.4, -122.6, 37.4, -122.1, cruise_band(5500))) == []
+    assert list(index.conflicts(37.4, -122.6, 37.4, -122.1, cruise_band(7500))) == [1]
+
+def test_class_e_never_blocks():
+    assert list(index.conflicts(36.0, -124.0, 39.0, -124.0, cruise_band(5500))) == []
+
+def test_restricted_area_blocks_within_its_band():
+    assert list(index.conflicts(37.5, -122.2, 37.5, -121.7, cruise_band(3500))) == [3]
+    assert list(index.conflicts(37.5, -122.2, 37.5, -121.7, cruise_band(6500))) == []
+
+def test_exempt_endpoint_airspace():
+    exempt = index.containing_any([(37.62, -122.375)])
+    assert exempt == {0, 1, 2}
+    assert list(index.conflicts(37.62, -122.375, 37.62, -122.6, cruise_band(3500), exempt)) == []
+
+def test_lowest_clear_altitude():
+    assert index.lowest_clear_altitude(37.2, -122.6, 37.9, -122.1, 3500, 1000, 17500) == 10500
+    assert index.lowest_clear_altitude(37.0, -122.6, 37.0, -122.5, 3500, 1000, 17500) == 3500
+    assert index.lowest_clear_altitude(37.2, -122.6, 37.9, -122.1, 3500, 1000, 9500) is None
+
+def test_band_mask():
+    assert index.band_mask(cruise_band(5500)).tolist() == [True, False, False, False]
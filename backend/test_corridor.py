@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+from corridor import CorridorIndex, glide_radius_nm
+
+# Airports around a west-to-east route along 40N from 100W to 98W (about 92 nm)
+AIRPORTS = [
+    ("ONRT", "On Route", 40.0, -99.5, True),
+    ("NRTH", "North Side", 40.05, -99.0, False),   # ~3 nm left of track
+    ("STH1", "South Side", 39.9, -98.5, True),     # ~6 nm right of track
+    ("FAR1", "Far Away", 41.0, -99.0, True),       # ~60 nm off track
+    ("BEHD", "Behind Start", 40.0, -100.1, False), # ~4.6 nm before the start
+]
+
+
+@pytest.fixture
+def index():
+    codes, names, lats, lons, fuel = zip(*AIRPORTS)
+    return CorridorIndex(codes, names, lats, lons, fuel)
+
+
+def test_glide_radius():
+    assert glide_radius_nm(6076.12, 9) == pytest.approx(9.0)
+    assert glide_radius_nm(-100) == 0.0
+
+
+def test_query_orders_by_along_track(index):
+    found = index.query([(40.0, -100.0), (40.0, -98.0)], 10)
+    assert [a['icao'] for a in found] == ["BEHD", "ONRT", "NRTH", "STH1"]
+    by_code = {a['icao']: a for a in found}
+    assert by_code["BEHD"]['along_track_nm'] == 0
+    assert by_code["ONRT"]['cross_track_nm'] == pytest.approx(0, abs=0.5)
+    assert by_code["NRTH"]['cross_track_nm'] < 0  # left of an eastbound route
+    assert by_code["STH1"]['cross_track_nm'] > 0
+    assert by_code["STH1"]['along_track_nm'] == pytest.approx(1.5 * 60 * math.cos(math.radians(40)), abs=1)
+
+
+def test_query_radius_and_filters(index):
+    route = [(40.0, -100.0), (40.0, -98.0)]
+    assert [a['icao'] for a in index.query(route, 4)] == ["ONRT", "NRTH"]
+    assert [a['icao'] for a in index.query(route, 10, fuel_only=True)] == ["ONRT", "STH1"]
+    assert [a['icao'] for a in index.query(route, 10, exclude=["behd"])] == ["ONRT", "NRTH", "STH1"]
+
+
+def test_query_multi_leg_accumulates_along_track(index):
+    # Dog-leg through FAR1: the far airport is now on the route
+    route = [(40.0, -100.0), (41.0, -99.0), (40.0, -98.0)]
+    found = index.query(route, 2)
+    assert [a['icao'] for a in found] == ["FAR1"]
+    assert found[0]['along_track_nm'] == pytest.approx(index.query([(40.0, -100.0), (41.0, -99.0)], 2)[0]['along_track_nm'], abs=0.1)
+
+
+def test_nearest(index):
+    assert index.nearest(40.0, -99.4)['icao'] == "ONRT"
+    assert index.nearest(40.0, -99.4, exclude=["ONRT"])['icao'] == "NRTH"
+    assert index.nearest(40.0, -99.4, exclude=["ONRT"], fuel_only=True)['icao'] == "STH1"
+    assert index.nearest(10.0, -60.0) is None
@@ -0,0 +1,70 @@
+from shapely.geometry import LineString, Point, Polygon, box
+from detour import DetourPlanner
+
+CLASS_B = Point(-122.375, 37.62).buffer(0.12)
+WALL = Polygon([(-121.8, 37.0), (-121.7, 37.0), (-121.7, 38.2), (-121.8, 38.2)])
+planner = DetourPlanner([CLASS_B, WALL, LineString([(0, 0), (1, 1)])])
+
+
+def as_line(path):
+    return LineString([(lon, lat) for lat, lon in path])
+
+def test_clear_leg_is_unchanged():
+    start, end = (37.5, -122.0), (37.55, -121.95)
+    assert planner.plan(start, end) == [start, end]
+
+def test_detour_clears_obstacles():
+    start, end = (37.62, -122.8), (37.62, -121.0)
+    path = planner.plan(start, end)
+    assert path[0] == start and path[-1] == end
+    assert len(path) > 2
+    line = as_line(path)
+    assert not line.intersects(CLASS_B)
+    assert not line.intersects(WALL)
+
+def test_detour_keeps_clearance():
+    path = planner.plan((37.3, -122.6), (37.9, -122.3))
+    # 2 nm buffer, half of it is the hard keep-out
+    assert as_line(path).distance(CLASS_B) > 1.0 / 60
+
+def test_obstacle_containing_endpoint_is_ignored():
+    start, end = (37.62, -122.375), (37.62, -122.0)
+    assert planner.plan(start, end) == [start, end]
+
+def test_inactive_obstacles_are_ignored():
+    start, end = (37.62, -122.8), (37.62, -121.9)
+    assert planner.blocking(*start, *end) == [0]
+    assert planner.plan(start, end, active=[1]) == [start, end]
+
+def test_non_polygons_are_skipped():
+    assert len(planner) == 2
+
+def test_obstacles_off_the_direct_leg_are_avoided():
+    # A second area sits right where the way around CLASS_B would go
+    north = Point(-122.375, 37.9).buffer(0.12)
+    wide = DetourPlanner([CLASS_B, north])
+    start, end = (37.62, -122.8), (37.62, -121.95)
+    assert wide.blocking(*start, *end) == [0]
+    line = as_line(wide.plan(start, end))
+    assert not line.intersects(CLASS_B)
+    assert not line.intersects(north)
+
+def test_enclosed_endpoint_gets_out():
+    # Two half rings around the start, with gaps east and west that are open
+    # between the keep-out areas but closed between the buffered outlines
+    ring = Point(-122.0, 37.5).buffer(0.4).difference(Point(-122.0, 37.5).buffer(0.3))
+    gap = box(-123.0, 37.47, -121.0, 37.53)
+    halves = ring.difference(gap).geoms
+    enclosed = DetourPlanner(halves)
+    start, end = (37.5, -122.0), (38.5, -122.0)
+    path = enclosed.plan(start, end)
+    assert path is not None
+    assert not any(as_line(path).intersects(k) for k in enclosed.keep_out)
+
+class Expired:
+    def expired(self):
+        return True
+
+def test_expired_deadline_gives_up():
+    start, end = (37.62, -122.8), (37.62, -121.0)
+    assert planner.plan(start, end, deadline=Expired()) is None
@@ -0,0 +1,160 @@
+import asyncio
+from elevation_cache import ElevationCache
+
+
+def make_fetcher(calls, delay=0.01, fail=()):
+    async def fetch(lat, lon):
+        calls.append((lat, lon))
+        await asyncio.sleep(delay)
+        if (lat, lon) in fail:
+            return None
+        return lat * 10
+    return fetch
+
+def test_quantized_cells_and_memory_hits():
+    cache = ElevationCache(grid_deg=0.01)
+    calls = []
+    fetch = make_fetcher(calls)
+    first = asyncio.run(cache.get_many([(40.001, -73.0), (40.002, -73.001)], fetch))
+    assert len(calls) == 1  # both points snap to the same cell
+    assert first[(40.001, -73.0)] == first[(40.002, -73.001)] == 400.0
+    asyncio.run(cache.get_many([(40.0, -73.0)], fetch))
+    assert len(calls) == 1
+    assert cache.snapshot()["memory_hits"] == 1
+
+def test_concurrent_lookups_are_coalesced():
+    cache = ElevationCache(grid_deg=0.01)
+    calls = []
+    fetch = make_fetcher(calls, delay=0.05)
+
+    async def run():
+        return await asyncio.gather(*[cache.get_many([(41.0, -72.0)], fetch) for _ in range(5)])
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r[(41.0, -72.0)] == 410.0 for r in results)
+    assert cache.snapshot()["coalesced"] == 4
+
+def test_lru_is_bounded():
+    cache = ElevationCache(grid_deg=0.01, max_entries=2)
+    fetch = make_fetcher([])
+    asyncio.run(cache.get_many([(1.0, 1.0), (2.0, 2.0), (3.0, 3.0)], fetch))
+    assert cache.snapshot()["memory_entries"] == 2
+
+def test_failures_are_not_cached():
+    cache = ElevationCache(grid_deg=0.01)
+    calls = []
+    fetch = make_fetcher(calls, fail={(5.0, 5.0)})
+    assert asyncio.run(cache.get_many([(5.0, 5.0)], fetch))[(5.0, 5.0)] is None
+    asyncio.run(cache.get_many([(5.0, 5.0)], fetch))
+    assert len(calls) == 2
+
+def test_disk_tier_shared_between_instances(tmp_path):
+    path = str(tmp_path / "elev.sqlite3")
+    calls = []
+    fetch = make_fetcher(calls)
+    asyncio.run(ElevationCache(path=path, grid_deg=0.01).get_many([(45.0, -110.0)], fetch))
+    other = ElevationCache(path=path, grid_deg=0.01)
+    assert asyncio.run(other.get_many([(45.0, -110.0)], fetch))[(45.0, -110.0)] == 450.0
+    assert len(calls) == 1
+    assert other.snapshot()["disk_hits"] == 1
+
+def test_live_lease_defers_to_other_worker(tmp_path):
+    path = str(tmp_path / "elev.sqlite3")
+    a = ElevationCache(path=path, grid_deg=0.01)
+    b = ElevationCache(path=path, grid_deg=0.01)
+    calls = []
+    fetch = make_fetcher(calls, delay=0.2)
+
+    async def run():
+        return await asyncio.gather(a.get_many([(30.0, -90.0)], fetch), b.get_many([(30.0, -90.0)], fetch))
+    ra, rb = asyncio.run(run())
+    assert len(calls) == 1
+    assert ra[(30.0, -90.0)] == rb[(30.0, -90.0)] == 300.0
+
+def test_cancelled_owner_does_not_starve_waiters():
+    cache = ElevationCache(grid_deg=0.01)
+    calls = []
+    fetch = make_fetcher(calls, delay=0.05)
+
+    async def run():
+        owner = asyncio.ensure_future(cache.get_many([(42.0, -71.0)], fetch))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(cache.get_many([(42.0, -71.0)], fetch))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return await waiter
+    assert asyncio.run(run())[(42.0, -71.0)] == 420.0
+    assert len(calls) == 1
+    assert cache.snapshot()["memory_entries"] == 1
+
+def test_skipped_fetch_is_retried_by_waiters():
+    from elevation_cache import FetchSkipped
+    cache = ElevationCache(grid_deg=0.01)
+    calls = []
+    real = make_fetcher(calls, delay=0.02)
+
+    async def skip(lat, lon):
+        await asyncio.sleep(0.02)
+        raise FetchSkipped()
+
+    async def run():
+        owner = asyncio.ensure_future(cache.get_many([(43.0, -70.0)], skip))
+        await asyncio.sleep(0.005)
+        waiter = await cache.get_many([(43.0, -70.0)], real)
+        return await owner, waiter
+    owner, waiter = asyncio.run(run())
+    assert owner[(43.0, -70.0)] is None
+    assert waiter[(43.0, -70.0)] == 430.0
+    assert len(calls) == 1
+
+def test_released_lease_stops_waiting(tmp_path):
+    path = str(tmp_path / "elev.sqlite3")
+    cache = ElevationCache(path=path, grid_deg=0.01, lease_s=5)
+    other = ElevationCache(path=path, grid_deg=0.01, lease_s=5)
+    cell = cache.cell(44.0, -69.0)
+    mine, _ = other._db_lease([cell])
+    assert mine == [cell]
+    other._db_release([cell])
+    import time
+    started = time.monotonic()
+    assert asyncio.run(cache._await_other_workers([cell])) == {}
+    assert time.monotonic() - started < 1
+
+class Budget:
+    def __init__(self, seconds):
+        import time
+        self.expires = time.monotonic() + seconds
+    def remaining(self):
+        import time
+        return max(0.0, self.expires - time.monotonic())
+
+def test_lease_wait_stops_at_deadline(tmp_path):
+    path = str(tmp_path / "elev.sqlite3")
+    cache = ElevationCache(path=path, grid_deg=0.01, lease_s=10)
+    other = ElevationCache(path=path, grid_deg=0.01, lease_s=10)
+    cell = cache.cell(45.0, -68.0)
+    other._db_lease([cell])
+
+    async def skip_when_late(lat, lon):
+        from elevation_cache import FetchSkipped
+        raise FetchSkipped()
+    import time
+    started = time.monotonic()
+    found = asyncio.run(cache.get_many([(45.0, -68.0)], skip_when_late, Budget(0.2)))
+    assert found[(45.0, -68.0)] is None
+    assert time.monotonic() - started < 1
+
+def test_coalesced_wait_stops_at_deadline():
+    cache = ElevationCache(grid_deg=0.01)
+    calls = []
+    slow = make_fetcher(calls, delay=0.5)
+
+    async def run():
+        owner = asyncio.ensure_future(cache.get_many([(46.0, -67.0)], slow))
+        await asyncio.sleep(0.01)
+        waiter = await cache.get_many([(46.0, -67.0)], slow, Budget(0.05))
+        return waiter, await owner
+    waiter, owner = asyncio.run(run())
+    assert waiter[(46.0, -67.0)] is None
+    assert owner[(46.0, -67.0)] == 460.0
+    assert len(calls) == 1
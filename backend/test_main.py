@@ -90,4 +90,360 @@ def test_terrain_profile():
     j = r.json()
     assert isinstance(j, list)
     assert len(j) == 2
-    assert "elevation" in j[0] 
\ No newline at end of file
+    assert "elevation" in j[0] 
+
+def test_airport_search():
+    r = client.get("/airports/search?q=kjf")
+    assert r.status_code == 200
+    j = r.json()
+    assert j["results"]
+    assert any(a["icao"] == ORIGIN for a in j["results"])
+    assert {"icao", "name", "lat", "lon"} <= set(j["results"][0])
+
+def test_airport_search_exact_code_first():
+    r = client.get(f"/airports/search?q={DEST}&limit=5")
+    assert r.status_code == 200
+    j = r.json()
+    assert j["results"][0]["icao"] == DEST
+    assert len(j["results"]) <= 5
+
+def test_route_terrain_profile():
+    route = [[40.6413, -73.7781], [41.0, -72.5], [42.3656, -71.0096]]
+    r = client.post("/terrain-profile/route", json={"route": route, "spacing_nm": 5})
+    assert r.status_code == 200
+    j = r.json()
+    assert len(j["distance_nm"]) == len(j["elevation"]) > len(route)
+    assert len(j["leg_offsets"]) == 2
+    assert len(j["leg_max_elevation"]) == 2
+    assert j["distance_nm"] == sorted(j["distance_nm"])
+    assert abs(j["distance_nm"][-1] - j["total_distance_nm"]) < 0.01
+
+def test_route_terrain_profile_float32():
+    route = [[40.6413, -73.7781], [42.3656, -71.0096]]
+    r = client.post("/terrain-profile/route", json={"route": route, "spacing_nm": 10, "encoding": "float32"})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/octet-stream"
+    n = int(r.headers["x-profile-samples"])
+    assert len(r.content) == n * 2 * 4
+
+def test_elevation_cache_stats():
+    points = [[40.6413, -73.7781]]
+    client.post("/terrain-profile", json={"points": points})
+    client.post("/terrain-profile", json={"points": points})
+    r = client.get("/elevation-cache/stats")
+    assert r.status_code == 200
+    j = r.json()
+    assert j["memory_hits"] + j["disk_hits"] + j["errors"] >= 1
+    assert 0 <= j["hit_rate"] <= 1
+
+def test_health_and_readiness():
+    r = client.get("/healthz")
+    assert r.status_code == 200
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    assert r.json()["status"] == "ready"
+
+def test_not_ready_returns_503():
+    import main
+    saved = dict(main.startup_state)
+    main.startup_state.update(status="loading", stage="graph", progress=0.5)
+    try:
+        r = client.get(f"/airport/{ORIGIN}")
+        assert r.status_code == 503
+        assert "retry-after" in r.headers
+        assert client.get("/healthz").status_code == 200
+        r = client.get("/readyz")
+        assert r.status_code == 503
+        assert r.json()["progress"] == 0.5
+    finally:
+        main.startup_state.clear()
+        main.startup_state.update(saved)
+
+def test_failed_startup_fails_liveness():
+    import main
+    saved = dict(main.startup_state)
+    main.startup_state.update(status="failed", error="boom")
+    try:
+        assert client.get("/healthz").status_code == 503
+        assert client.get("/readyz").status_code == 503
+    finally:
+        main.startup_state.clear()
+        main.startup_state.update(saved)
+
+def test_route_reports_partial_flag():
+    r = client.post("/route", json={"origin": ORIGIN, "destination": DEST, "speed": 120, "speed_unit": "knots", "altitude": 5500, "avoid_airspaces": False, "avoid_terrain": False})
+    assert r.status_code == 200
+    assert r.json()["partial"] is False
+    assert r.json()["unreached"] is None
+
+def test_route_time_budget_exhausted():
+    r = client.post("/route", json={"origin": ORIGIN, "destination": DEST, "speed": 120, "speed_unit": "knots", "altitude": 5500, "avoid_airspaces": False, "avoid_terrain": False, "time_budget_s": 1e-9})
+    assert r.status_code in (200, 504)
+    if r.status_code == 504:
+        assert "time budget" in r.json()["error"]["message"]
+    else:
+        j = r.json()
+        assert j["partial"] is True
+        if j["unreached"] is not None:
+            assert j["route"][-1] == j["unreached"]["from"] != DEST
+            assert j["unreached"]["to"] == DEST
+
+def test_search_route_returns_best_so_far():
+    import main
+
+    class CountingDeadline(main.Deadline):
+        # Expires after a fixed number of checks instead of wall-clock time
+        def __init__(self, checks):
+            super().__init__(60)
+            self.checks = checks
+        def expired(self):
+            self.checks -= 1
+            return self.checks < 0
+
+    o, d = main.get_airport_info(ORIGIN), main.get_airport_info(DEST)
+    origin = main.closest_node(o["lat"], o["lon"], main.nodes)
+    dest = main.closest_node(d["lat"], d["lon"], main.nodes)
+    checked = set()
+    def edge_ok(n1, n2, d):
+        checked.add((n1['id'], n2['id']))
+        return True
+    paths, partial = main.search_route(origin, dest, edge_ok, CountingDeadline(2))
+    assert partial
+    path = paths[0]
+    # Only legs the search actually checked, and no jump to the destination
+    assert path[0] == origin["id"] and path[-1] != dest["id"]
+    assert all(leg in checked for leg in zip(path, path[1:]))
+    paths, partial = main.search_route(origin, dest, edge_ok, CountingDeadline(0))
+    assert paths == [] and partial
+    paths, partial = main.search_route(origin, dest, lambda n1, n2, d: True, main.Deadline(60))
+    assert not partial
+    full = paths[0]
+    assert full[0] == origin["id"] and full[-1] == dest["id"]
+
+def test_route_alternatives():
+    req = {"origin": ORIGIN, "destination": DEST, "speed": 120, "altitude": 5500,
+           "avoid_airspaces": False, "avoid_terrain": False, "max_leg_distance": 60, "alternatives": 2}
+    r = client.post("/route", json=req)
+    assert r.status_code == 200
+    j = r.json()
+    assert len(j["alternatives"]) <= 2
+    routes = [j["route"]] + [alt["route"] for alt in j["alternatives"]]
+    assert len(set(map(tuple, routes))) == len(routes)
+    for alt in j["alternatives"]:
+        assert alt["route"][0] == j["route"][0] and alt["route"][-1] == j["route"][-1]
+        assert len(set(alt["route"])) == len(alt["route"])
+        assert alt["distance_nm"] >= j["distance_nm"]
+        assert len(alt["segments"]) == len(alt["route"]) - 1
+
+def test_alternative_paths_on_small_graph(monkeypatch):
+    import main
+    # Best is S-A-B-T along 40N. N and Q give disjoint detours, V only differs
+    # on the last stretch and F is far beyond the stretch limit
+    coords = {"S": (40.0, -100.0), "A": (40.0, -99.7), "B": (40.0, -99.3), "T": (40.0, -99.0),
+              "N": (40.1, -99.5), "Q": (39.88, -99.5), "V": (40.03, -99.15), "F": (41.0, -99.5)}
+    nodes = {k: {"id": k, "lat": lat, "lon": lon} for k, (lat, lon) in coords.items()}
+    monkeypatch.setattr(main, "node_by_id", nodes)
+    edges = [("S", "A"), ("A", "B"), ("B", "T"), ("S", "N"), ("N", "T"), ("S", "Q"), ("Q", "T"),
+             ("B", "V"), ("V", "T"), ("S", "F"), ("F", "T")]
+    graph = {k: [] for k in coords}
+    for a, b in edges:
+        d = main.haversine(*coords[a], *coords[b])
+        graph[a].append({"to": b, "distance": d})
+        graph[b].append({"to": a, "distance": d})
+    monkeypatch.setattr(main, "node_graph", graph)
+    trees = []
+    real_tree = main.shortest_path_tree
+    def counting_tree(*args, **kwargs):
+        trees.append(args[0])
+        return real_tree(*args, **kwargs)
+    monkeypatch.setattr(main, "shortest_path_tree", counting_tree)
+
+    paths, partial = main.search_route(nodes["S"], nodes["T"], lambda n1, n2, d: True, main.Deadline(60), alternatives=2)
+    assert not partial
+    assert paths == [["S", "A", "B", "T"], ["S", "N", "T"], ["S", "Q", "T"]]
+    # One forward and one backward tree, however many alternatives
+    assert trees == ["S", "T"]
+    best = main.path_edges(paths[0])
+    best_len = sum(best.values())
+    for path in paths[1:]:
+        assert len(set(path)) == len(path)
+        edges = main.path_edges(path)
+        length = sum(edges.values())
+        assert length <= best_len * main.ALTERNATIVE_MAX_STRETCH
+        assert sum(l for e, l in edges.items() if e in best) <= main.ALTERNATIVE_MAX_SHARING * length
+
+    # V shares too much with the best route and F is too long: asking for more changes nothing
+    trees.clear()
+    more, _ = main.search_route(nodes["S"], nodes["T"], lambda n1, n2, d: True, main.Deadline(60), alternatives=5)
+    assert more == paths
+    assert trees == ["S", "T"]
+    one, _ = main.search_route(nodes["S"], nodes["T"], lambda n1, n2, d: True, main.Deadline(60), alternatives=1)
+    assert one == paths[:2]
+
+def test_route_without_alternatives_omits_field():
+    req = {"origin": ORIGIN, "destination": DEST, "speed": 120, "altitude": 5500,
+           "avoid_airspaces": False, "avoid_terrain": False}
+    r = client.post("/route", json=req)
+    assert r.status_code == 200
+    assert "alternatives" not in r.json()
+
+def test_route_corridor_airports():
+    req = {"origin": ORIGIN, "destination": DEST, "speed": 120, "altitude": 5500,
+           "avoid_airspaces": False, "avoid_terrain": False, "max_leg_distance": 500, "corridor_nm": 15}
+    r = client.post("/route", json=req)
+    assert r.status_code == 200
+    j = r.json()
+    assert j["corridor_nm"] == 15
+    along = [a["along_track_nm"] for a in j["corridor_airports"]]
+    assert along == sorted(along)
+    assert all(abs(a["cross_track_nm"]) <= 15 for a in j["corridor_airports"])
+    assert ORIGIN not in [a["icao"] for a in j["corridor_airports"]]
+
+def test_isochrone_respects_aircraft_range(monkeypatch):
+    import main
+    from shapely.geometry import shape
+    # Lone origin: the isochrone is one disc of whatever distance is left to fly,
+    # which the aircraft's range caps below both max_leg_distance and the budget
+    origin = {"id": "S", "lat": 0.0, "lon": 0.0, "type": "airport"}
+    monkeypatch.setattr(main, "nodes", [origin])
+    monkeypatch.setattr(main, "node_by_id", {"S": origin})
+    monkeypatch.setattr(main, "node_graph", {"S": []})
+    req = main.ReachableRequest(origin="S", speed=100, altitude=5500, max_distance_nm=100,
+                                max_leg_distance=150, aircraft_range_nm=30, include_isochrone=True)
+    *_, isochrone, partial = main.reachable_airports(req, origin, main.Deadline(60))
+    assert not partial
+    minx, miny, maxx, maxy = shape(isochrone).bounds
+    assert 29 * 2 <= (maxy - miny) * 60 <= 30 * 2
+
+def test_reachable():
+    req = {"origin": ORIGIN, "speed": 120, "altitude": 5500, "max_hours": 1.0, "max_leg_distance": 60,
+           "include_isochrone": True}
+    r = client.post("/reachable", json=req)
+    assert r.status_code == 200
+    j = r.json()
+    assert j["count"] == len(j["airports"]) > 0
+    assert all(a["distance_nm"] <= 120 and a["legs"] >= 1 for a in j["airports"])
+    dists = [a["distance_nm"] for a in j["airports"]]
+    assert dists == sorted(dists)
+    assert ORIGIN not in [a["icao"] for a in j["airports"]]
+    assert j["isochrone"]["type"] in ("Polygon", "MultiPolygon")
+    # Must agree with a point-to-point route to the same airport
+    target = j["airports"][-1]
+    route = client.post("/route", json={"origin": ORIGIN, "destination": target["icao"], "speed": 120, "altitude": 5500,
+                                        "avoid_airspaces": False, "avoid_terrain": False, "max_leg_distance": 60}).json()
+    assert abs(route["distance_nm"] - target["distance_nm"]) < 0.5
+
+def test_reachable_stream():
+    import json
+    req = {"origin": ORIGIN, "speed": 120, "altitude": 5500, "max_distance_nm": 200, "stream": True}
+    r = client.post("/reachable", json=req)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0]["origin"] == ORIGIN
+    assert lines[-1]["count"] == len(lines) - 2
+
+def test_leg_limit_keeps_fewer_leg_detours(monkeypatch):
+    import main
+    # S-A-B-T is cheapest, but with two legs T is only reachable via S-B
+    coords = {"S": (40.0, -100.0), "A": (40.0, -99.9), "B": (40.0, -99.8), "T": (40.0, -99.7)}
+    monkeypatch.setattr(main, "node_by_id", {k: {"id": k, "lat": lat, "lon": lon} for k, (lat, lon) in coords.items()})
+    edges = [("S", "A", 1), ("A", "B", 1), ("B", "T", 1), ("S", "B", 5)]
+    graph = {k: [] for k in coords}
+    for a, b, d in edges:
+        graph[a].append({"to": b, "distance": d})
+        graph[b].append({"to": a, "distance": d})
+    monkeypatch.setattr(main, "node_graph", graph)
+    tree = main.shortest_path_tree("S", lambda n1, n2, d: True, max_legs=2)
+    assert tree["dist"] == {"S": 0, "A": 1, "B": 2, "T": 6}
+    assert tree["legs"]["T"] == 2
+    assert main.tree_path(tree, "T") == ["S", "B", "T"]
+    assert main.tree_path(tree, "B") == ["S", "A", "B"]
+    assert main.shortest_path_tree("S", lambda n1, n2, d: True)["dist"]["T"] == 3
+
+def test_reachable_rejects_zero_speed():
+    r = client.post("/reachable", json={"origin": ORIGIN, "speed": 0, "altitude": 5500, "max_distance_nm": 100})
+    assert r.status_code == 422
+
+def test_reachable_requires_limit():
+    r = client.post("/reachable", json={"origin": ORIGIN, "speed": 120, "altitude": 5500})
+    assert r.status_code == 400
+
+def test_airspaces_geojson():
+    r = client.get("/airspaces?min_lat=30&min_lon=-125&max_lat=45&max_lon=-65")
+    assert r.status_code == 200
+    j = r.json()
+    assert j["type"] == "FeatureCollection"
+    for feature in j["features"]:
+        assert feature["geometry"]["type"] in ("Polygon", "MultiPolygon")
+        assert "name" in feature["properties"]
+
+def test_large_responses_are_compressed():
+    r = client.get("/airspaces?min_lat=30&min_lon=-125&max_lat=45&max_lon=-65", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    if len(r.content) > 1024:
+        assert r.headers.get("content-encoding") == "gzip"
+        # brotli-asgi (requirements.txt) serves br to clients that take it
+        brotli = any(m.cls.__name__ == "BrotliMiddleware" for m in app.user_middleware)
+        r = client.get("/airspaces?min_lat=30&min_lon=-125&max_lat=45&max_lon=-65", headers={"Accept-Encoding": "br, gzip"})
+        assert r.headers.get("content-encoding") == ("br" if brotli else "gzip")
+
+def test_elevation_fetch_concurrency_is_bounded(monkeypatch):
+    import asyncio
+    import main
+    from elevation_cache import ElevationCache
+
+    class FakeResponse:
+        status_code = 200
+        def json(self):
+            return {"data": [[0, 0, 100]]}
+
+    class FakeClient:
+        active = peak = 0
+        async def get(self, url, timeout):
+            FakeClient.active += 1
+            FakeClient.peak = max(FakeClient.peak, FakeClient.active)
+            await asyncio.sleep(0.001)
+            FakeClient.active -= 1
+            return FakeResponse()
+
+    monkeypatch.setattr(main, "elevation_cache", ElevationCache())
+    monkeypatch.setattr(main, "ELEVATION_FETCH_CONCURRENCY", 4)
+    points = [(40 + i * 0.01, -100.0) for i in range(50)]
+    found = asyncio.run(main.fetch_elevation_batch(points, FakeClient()))
+    assert set(found.values()) == {100}
+    assert FakeClient.peak <= 4
+
+def test_route_terrain_profile_respects_budget():
+    r = client.post("/terrain-profile/route", json={"route": [[40.0, -100.0], [41.0, -99.0]], "spacing_nm": 1, "time_budget_s": 1e-9})
+    assert r.status_code == 200
+    j = r.json()
+    assert j["partial"] is True
+    assert len(j["elevation"]) == len(j["distance_nm"])
+
+def test_unclearable_legs_are_reported(monkeypatch):
+    import asyncio
+    import main
+    from shapely.geometry import box
+    from airspace_index import AirspaceIndex
+    # A restricted area from the surface to FL250 across the first leg only
+    wall = AirspaceIndex([box(-100.05, 39, -99.95, 41)], [0.0], [25000.0])
+    monkeypatch.setattr(main, "airspace_index", wall)
+    legs = [((40.0, -100.5), (40.0, -99.5)), ((42.0, -100.5), (42.0, -99.5))]
+    alts, blocked, terrain = asyncio.run(main.get_all_leg_vfr_altitudes(legs, fetch_terrain=False))
+    assert terrain == [0, 0]
+    assert blocked == [0]
+    assert alts[1] == 3500
+
+def test_glide_corridor_uses_height_above_ground(monkeypatch):
+    import main
+    from corridor import glide_radius_nm
+    monkeypatch.setattr(main, "code_to_row", {"KHI": {"elevation_ft": "7000"}, "KLO": {"elevation_ft": "100"}})
+    ground = main.route_ground_ft(["KLO", "DETOUR", "KHI"], [5200.0])
+    assert ground == 7000.0
+    req = main.RouteRequest(origin="KLO", destination="KHI", altitude=9500, speed=100,
+                            avoid_airspaces=False, avoid_terrain=False)
+    legs = [((40.0, -105.0), (40.0, -104.0))]
+    summary = main.route_summary(req, [legs[0][0], legs[0][1]], ["KLO", "KHI"], legs, [9500], ground)
+    assert summary["corridor_nm"] == round(glide_radius_nm(2500), 1)
+    assert summary["corridor_ground_ft"] == 7000
@@ -0,0 +1,45 @@
+import json
+
+import numpy as np
+
+from serialization import FastJSONResponse, compact_weather, dumps, encode_feature, feature_collection, trim_coords
+
+
+def test_dumps_handles_numpy_and_tuples():
+    out = json.loads(dumps({"a": np.float64(1.5), "b": np.array([1, 2]), "c": (3, 4)}))
+    assert out == {"a": 1.5, "b": [1, 2], "c": [3, 4]}
+
+
+def test_response_renders_compact_json():
+    body = FastJSONResponse({"x": [1, 2]}).body
+    assert json.loads(body) == {"x": [1, 2]}
+    assert b" " not in body
+
+
+def test_trim_coords_nested():
+    assert trim_coords([[(1.123456789, 2.0)], 3]) == [[[1.12346, 2.0]], 3]
+
+
+def test_feature_collection_is_valid_geojson():
+    geometry = {"type": "Polygon", "coordinates": [[[0.123456789, 1], [1, 1], [1, 0], [0.123456789, 1]]]}
+    features = [encode_feature(geometry, {"name": "A"}), encode_feature(geometry, {"name": "B"})]
+    fc = json.loads(feature_collection(features))
+    assert fc["type"] == "FeatureCollection"
+    assert [f["properties"]["name"] for f in fc["features"]] == ["A", "B"]
+    assert fc["features"][0]["geometry"]["coordinates"][0][0] == [0.12346, 1]
+    assert json.loads(feature_collection([])) == {"type": "FeatureCollection", "features": []}
+
+
+def test_compact_weather():
+    raw = {"coord": {"lon": 1, "lat": 2}, "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+           "base": "stations", "main": {"temp": 20.5, "feels_like": 20, "pressure": 1013, "humidity": 50},
+           "visibility": 10000, "wind": {"speed": 3.1, "deg": 270}, "clouds": {"all": 0}, "dt": 1, "sys": {}, "name": "Town"}
+    assert compact_weather(raw) == {
+        "name": "Town",
+        "weather": [{"main": "Clear", "description": "clear sky"}],
+        "main": {"temp": 20.5, "pressure": 1013, "humidity": 50},
+        "wind": {"speed": 3.1, "deg": 270},
+        "visibility": 10000,
+        "clouds": {"all": 0},
+    }
+    assert compact_weather({"error": "x"}) == {"error": "x"}
@@ -78,6 +78,40 @@ function AirspaceOverlay({ setAirspaces }) {
   return null;
 }
 
+// Typeahead suggestions for an ICAO input, backed by /airports/search
+function useAirportSuggestions(query) {
+  const [suggestions, setSuggestions] = useState([]);
+  useEffect(() => {
+    const q = (query || '').trim();
+    if (q.length < 2) {
+      setSuggestions([]);
+      return undefined;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      fetch(`http://localhost:8000/airports/search?q=${encodeURIComponent(q)}&limit=8`, { signal: controller.signal })
+        .then((res) => res.json())
+        .then((data) => setSuggestions(data.results || []))
+        .catch(() => {});
+    }, 120);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query]);
+  return suggestions;
+}
+
+function AirportDatalist({ id, suggestions }) {
+  return (
+    <datalist id={id}>
+      {suggestions.map((a) => (
+        <option key={a.icao} value={a.icao}>{a.name}{a.city ? ` (${a.city})` : ''}</option>
+      ))}
+    </datalist>
+  );
+}
+
 function calculateCourse(lat1, lon1, lat2, lon2) {
   // Returns course in degrees from north
   const toRad = (deg) => deg * Math.PI / 180;
@@ -211,6 +245,8 @@ function App() {
   const [legTerrain, setLegTerrain] = useState([]); // [{maxElev, loading, error}]
   const [legTerrainLoading, setLegTerrainLoading] = useState(false);
   const [routeLoading, setRouteLoading] = useState(false);
+  const originSuggestions = useAirportSuggestions(form.origin);
+  const destinationSuggestions = useAirportSuggestions(form.destination);
 
   useEffect(() => {
     localStorage.setItem('flightForm', JSON.stringify(form));
@@ -224,66 +260,41 @@ function App() {
   }, []);
 
   useEffect(() => {
-    // Fetch terrain profile when route changes
-    if (routeResult && routeResult.origin_coords && routeResult.destination_coords) {
+    // Fetch a densified terrain profile for the whole route in one request;
+    // it also carries the per-leg maxima used by the legs table
+    if (routeResult && routeResult.segments && routeResult.segments.length > 0) {
       setTerrainLoading(true);
       setTerrainError(null);
-      const points = [routeResult.origin_coords, ...(routeResult.overflown_coords || []), routeResult.destination_coords];
-      fetch('http://localhost:8000/terrain-profile', {
+      setLegTerrainLoading(true);
+      // The flown path, detours included, one leg per segment so that
+      // leg_max_elevation[i] lines up with routeResult.segments[i]
+      const route = [routeResult.segments[0].start, ...routeResult.segments.map((seg) => seg.end)];
+      fetch('http://localhost:8000/terrain-profile/route', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ points }),
+        body: JSON.stringify({ route, spacing_nm: 2 }),
       })
         .then((res) => res.json())
         .then((data) => {
-          setTerrainProfile(data);
+          setTerrainProfile(data.elevation.map((elevation, i) => ({ elevation, distance: data.distance_nm[i] })));
+          setLegTerrain((data.leg_max_elevation || []).map((maxElev) => ({ maxElev: maxElev || 0, error: null })));
           setTerrainLoading(false);
+          setLegTerrainLoading(false);
         })
         .catch(() => {
           setTerrainProfile([]);
           setTerrainError('Could not fetch terrain profile');
+          setLegTerrain(route.slice(0, -1).map(() => ({ maxElev: 0, error: 'Could not fetch terrain' })));
           setTerrainLoading(false);
+          setLegTerrainLoading(false);
         });
     } else {
       setTerrainProfile([]);
       setTerrainError(null);
-    }
-  }, [routeResult]);
-
-  // Fetch terrain for all legs when route changes and avoid_terrain is checked
-  useEffect(() => {
-    if (
-      routeResult &&
-      routeResult.route &&
-      routeResult.route.length >= 2 &&
-      form.avoidTerrain
-    ) {
-      const points = [routeResult.origin_coords, ...(routeResult.overflown_coords || []), routeResult.destination_coords];
-      setLegTerrainLoading(true);
-      Promise.all(
-        points.slice(0, -1).map((from, i) => {
-          const to = points[i + 1];
-          return fetch('http://localhost:8000/terrain-profile', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ points: [from, to] }),
-          })
-            .then((res) => res.json())
-            .then((data) => ({
-              maxElev: Math.max(...data.map((p) => p.elevation || 0)),
-              error: null,
-            }))
-            .catch(() => ({ maxElev: 0, error: 'Could not fetch terrain' }));
-        })
-      ).then((results) => {
-        setLegTerrain(results);
-        setLegTerrainLoading(false);
-      });
-    } else {
       setLegTerrain([]);
       setLegTerrainLoading(false);
     }
-  }, [routeResult, form.avoidTerrain]);
+  }, [routeResult]);
 
   const handleChange = (e) => {
     const { name, value, type, checked } = e.target;
@@ -347,7 +358,7 @@ function App() {
   const fetchWeather = () => {
     if (!form.origin || !form.destination) return;
     setWeatherLoading(true);
-    fetch(`http://localhost:8000/weather?origin=${form.origin}&destination=${form.destination}`)
+    fetch(`http://localhost:8000/weather?origin=${form.origin}&destination=${form.destination}&compact=true`)
       .then(async (res) => {
         let data;
         try {
@@ -613,18 +624,13 @@ function App() {
               let minAlt = 0;
               let terrainMsg = '';
               if (form.avoidTerrain) {
-                // Fetch terrain profile for this leg
-                try {
-                  const res = await fetch('http://localhost:8000/terrain-profile', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ points: [from, to] }),
-                  });
-                  const data = await res.json();
-                  const maxElev = Math.max(...data.map(p => p.elevation || 0));
+                // Terrain maxima come with the route profile
+                const leg = legTerrain[i];
+                if (leg && !leg.error) {
+                  const maxElev = leg.maxElev;
                   minAlt = maxElev + 1000;
                   terrainMsg = `Highest terrain: ${maxElev.toFixed(0)} ft. Must cruise at least ${minAlt.toFixed(0)} ft.`;
-                } catch {
+                } else {
                   terrainMsg = 'Could not fetch terrain info.';
                 }
               }
@@ -783,9 +789,12 @@ function App() {
                   placeholder="e.g. KJFK"
                   value={form.origin}
                   onChange={handleChange}
+                  list="origin-suggestions"
+                  autoComplete="off"
                   required
                   style={{ padding: '10px 12px', borderRadius: 6, border: '1px solid #888', fontSize: 16 }}
                 />
+                <AirportDatalist id="origin-suggestions" suggestions={originSuggestions} />
               </div>
               <div style={{ display: 'flex', flexDirection: 'column', minWidth: 160 }}>
                 <label htmlFor="destination" style={{ fontWeight: 500, marginBottom: 6 }}>Destination</label>
@@ -795,9 +804,12 @@ function App() {
                   placeholder="e.g. KBOS"
                   value={form.destination}
                   onChange={handleChange}
+                  list="destination-suggestions"
+                  autoComplete="off"
                   required
                   style={{ padding: '10px 12px', borderRadius: 6, border: '1px solid #888', fontSize: 16 }}
                 />
+                <AirportDatalist id="destination-suggestions" suggestions={destinationSuggestions} />
               </div>
               <div style={{ display: 'flex', flexDirection: 'column', minWidth: 160 }}>
                 <label htmlFor="speed" style={{ fontWeight: 500, marginBottom: 6 }}>Speed</label>